@@ -0,0 +1,142 @@
+import argparse, json, os, platform, random, shutil, subprocess, sys, tempfile, time
+from datetime import datetime
+
+from lib.helper_functions import (
+    load_csv, save_csv, create_movie_bag, select_movies, update_ratings, compare_csvs
+)
+from lib.engine import RankingEngine, session_paths
+from benchmarks.synthetic import write_ratings_csv, make_oracle
+
+def best_of(repeats, setup, func):
+    timings = []
+    for _ in range(repeats):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return {'best_s': min(timings), 'mean_s': sum(timings) / len(timings), 'repeats': repeats}
+
+def simulate_session(engine, rounds, seed):
+    # A whole mode 1 session through the engine, with an oracle doing the ranking
+    rank = make_oracle(engine.movies, seed)
+    engine.start()
+    for _ in range(rounds):
+        engine.submit(rank(engine.state.selected_movies))
+    engine.close()
+
+def run_size(size, rounds, repeats, seed, workdir):
+    ratings_file = os.path.join(workdir, f'ratings_{size}.csv')
+    working_file = os.path.join(workdir, f'working_{size}.csv')
+    diff_file = os.path.join(workdir, f'changed_{size}.csv')
+    session_file = os.path.join(workdir, f'session_{size}.csv')
+    write_ratings_csv(ratings_file, size, seed)
+
+    def fresh_movies():
+        return (load_csv(ratings_file),)
+
+    def fresh_bag():
+        random.seed(seed)
+        return (create_movie_bag(load_csv(ratings_file)),)
+
+    def fresh_engine():
+        # The session saves its ratings back, so each run gets its own copy of the library
+        shutil.copyfile(ratings_file, session_file)
+        # Nor should it skip rounds on what an earlier run answered
+        comparisons_file = session_paths(session_file)['comparisons']
+        if os.path.exists(comparisons_file):
+            os.remove(comparisons_file)
+        return (RankingEngine("1", ratings_file=session_file, seed=seed),)
+
+    def drain_bag(bag):
+        while len(bag) >= 5:
+            select_movies(bag, 5)
+
+    def ranked_groups():
+        movies = load_csv(ratings_file)
+        rank = make_oracle(movies, seed)
+        groups = [sorted(movies[i:i + 5], key=lambda movie: movie.rating) for i in range(0, size - 4, 5)]
+        return ([(group, rank(group)) for group in groups],)
+
+    def apply_rankings(groups):
+        for group, ranking in groups:
+            update_ratings(group, ranking)
+
+    def modified_working_copy():
+        movies = load_csv(ratings_file)
+        rank = make_oracle(movies, seed)
+        for i in range(0, min(size, rounds * 5) - 4, 5):
+            group = sorted(movies[i:i + 5], key=lambda movie: movie.rating)
+            update_ratings(group, rank(group))
+        save_csv(working_file, movies)
+        return ()
+
+    results = {
+        'load_csv': best_of(repeats, lambda: (), lambda: load_csv(ratings_file)),
+        'create_movie_bag': best_of(repeats, fresh_movies, create_movie_bag),
+        # A whole bag cycle, so per-round cost can be read as this divided by size / 5
+        'select_movies_cycle': best_of(repeats, fresh_bag, drain_bag),
+        'update_ratings_all_groups': best_of(repeats, ranked_groups, apply_rankings),
+        'save_csv': best_of(repeats, fresh_movies, lambda movies: save_csv(working_file, movies)),
+        'compare_csvs': best_of(repeats, modified_working_copy, lambda: compare_csvs(ratings_file, working_file, diff_file)),
+        'session': best_of(repeats, fresh_engine, lambda engine: simulate_session(engine, rounds, seed)),
+    }
+    results['session']['rounds'] = rounds
+    return results
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_comparison(baseline, report):
+    print(f"{'size':>8} {'benchmark':<26} {'baseline s':>11} {'current s':>10} {'ratio':>7}", file=sys.stderr)
+    for size, results in report['results'].items():
+        for name, result in results.items():
+            previous = baseline['results'].get(size, {}).get(name)
+            if previous:
+                ratio = result['best_s'] / previous['best_s'] if previous['best_s'] else float('inf')
+                print(f"{size:>8} {name:<26} {previous['best_s']:>11.4f} {result['best_s']:>10.4f} {ratio:>7.2f}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the non-GUI ranking core on synthetic libraries.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--rounds', type=int, default=500, help="Rounds in the simulated session")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'rounds': args.rounds,
+            'repeats': args.repeats,
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            print(f"Benchmarking {size} films...", file=sys.stderr)
+            report['results'][str(size)] = run_size(size, args.rounds, args.repeats, args.seed, workdir)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            print_comparison(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
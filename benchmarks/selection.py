@@ -0,0 +1,104 @@
+import argparse, gc, random, time
+from collections import deque
+
+from lib.active_selection import ActiveBag, record_confirmations
+from lib.comparison_graph import ComparisonGraph
+from lib.helper_functions import create_movie_bag, select_movies, update_ratings
+from benchmarks.synthetic import make_movies, make_oracle, oracle_scores
+
+def legacy_select_movies(bag, num_movies):
+    # The deque-scanning selection this benchmark compares against
+    num_to_select = min(num_movies, len(bag))
+    selected = []
+    used_ratings = set()
+    temp_bag = []
+    while bag and len(selected) < num_to_select:
+        movie = bag.popleft()
+        if movie.rating not in used_ratings:
+            selected.append(movie)
+            used_ratings.add(movie.rating)
+        else:
+            temp_bag.append(movie)
+    bag.extend(temp_bag)
+    while len(selected) < num_to_select and bag:
+        selected.append(bag.popleft())
+    return selected
+
+def time_bag_cycle(bag, select):
+    # Draws rounds until the bag runs dry; the late rounds, once the rare ratings are used up,
+    # are where a scanning selection falls over
+    timings = []
+    gc.disable()
+    while len(bag) >= 5:
+        start = time.perf_counter()
+        select(bag, 5)
+        timings.append((time.perf_counter() - start) * 1e6)
+    gc.enable()
+    timings.sort()
+    return sum(timings) / len(timings), timings[int(len(timings) * 0.99)], timings[-1]
+
+def films_off_oracle(movies, scores):
+    # Films whose rating isn't the one they'd get if the library's ratings were handed out in oracle order
+    ratings = sorted(movie.rating for movie in movies)
+    ordered = sorted(movies, key=lambda movie: scores[movie.uri])
+    return sum(movie.rating != rating for movie, rating in zip(ordered, ratings))
+
+def simulate_strategy(size, rounds, seed, strategy):
+    # The engine's mode 1 loop without the I/O: draw a round, have the oracle rank it, update ratings
+    movies = make_movies(size, seed)
+    rank = make_oracle(movies, seed)
+    # Not the oracle's seed, or the bag's random draws would line up with the oracle's noise
+    random.seed(f'selection-{seed}')
+    confirmations = {}
+    # Kept in memory only; the engine's graph logs every round next to the ratings file
+    graph = ComparisonGraph(None, None)
+    bag = ActiveBag(movies, confirmations, graph) if strategy == 'active' else create_movie_bag(movies)
+    changed = 0
+    draw_seconds = 0.0
+    for _ in range(rounds):
+        if len(bag) < 2:
+            bag.refill(movies)
+        start = time.perf_counter()
+        group = select_movies(bag, 5)
+        draw_seconds += time.perf_counter() - start
+        group.sort(key=lambda movie: movie.rating)
+        old_ratings = [movie.rating for movie in group]
+        ranking = rank(group)
+        graph.add_round([group[i].uri for i in ranking])
+        update_ratings(group, ranking)
+        record_confirmations(confirmations, group, old_ratings)
+        changed += sum(movie.rating != old for movie, old in zip(group, old_ratings))
+    return changed / rounds, draw_seconds / rounds * 1e6, movies
+
+def compare_strategies(sizes, rounds, seed):
+    print(f"{'library':>10} {'strategy':>9} {'changes/round':>14} {'draw us':>8} {'off oracle':>11}")
+    for size in sizes:
+        scores = oracle_scores(make_movies(size, seed), seed)
+        for strategy in ('random', 'active'):
+            per_round, draw_us, movies = simulate_strategy(size, rounds, seed, strategy)
+            print(f"{size:>10} {strategy:>9} {per_round:>14.2f} {draw_us:>8.1f} {films_off_oracle(movies, scores):>11}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time select_movies against library size, and compare how many "
+                                                 "rating changes each selection strategy finds per round.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rounds', type=int, default=5000, help="Rounds each strategy is given with the simulated oracle")
+    args = parser.parse_args()
+
+    print(f"{'library':>10} {'legacy mean us':>15} {'legacy p99 us':>14} {'legacy max us':>14} "
+          f"{'bucketed mean us':>17} {'bucketed p99 us':>16} {'bucketed max us':>16}")
+    for size in args.sizes:
+        movies = make_movies(size, args.seed)
+        random.seed(args.seed)
+
+        legacy_mean, legacy_p99, legacy_max = time_bag_cycle(deque(random.sample(movies, len(movies))), legacy_select_movies)
+        bucketed_mean, bucketed_p99, bucketed_max = time_bag_cycle(create_movie_bag(movies), select_movies)
+        print(f"{size:>10} {legacy_mean:>15.1f} {legacy_p99:>14.1f} {legacy_max:>14.1f} "
+              f"{bucketed_mean:>17.1f} {bucketed_p99:>16.1f} {bucketed_max:>16.1f}")
+
+    print()
+    compare_strategies(args.sizes, args.rounds, args.seed)
+
+if __name__ == "__main__":
+    main()
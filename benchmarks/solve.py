@@ -0,0 +1,53 @@
+import argparse, logging, os, random, sys, tempfile, time
+
+from lib.bradley_terry import solve_ratings
+from lib.comparison_graph import write_comparisons
+from lib.engine import session_paths
+from lib.helper_functions import load_csv
+from benchmarks.synthetic import write_ratings_csv, oracle_scores
+
+def ranked_rounds(movies, rounds, seed, key):
+    # Rounds of five films ordered best to worst by key, as the comparisons log holds them
+    rng = random.Random(seed)
+    return [[movie.uri for movie in sorted(rng.sample(movies, 5), key=key, reverse=True)] for _ in range(rounds)]
+
+def time_solve(size, rounds, seed, workdir, order):
+    ratings_file = os.path.join(workdir, f'{order}_{size}.csv')
+    write_ratings_csv(ratings_file, size, seed)
+    movies = load_csv(ratings_file)
+    if order == 'agreeing':
+        # Every round in rating order, ties as drawn: nothing here goes against a rating
+        key = lambda movie: movie.rating
+    else:
+        scores = oracle_scores(movies, seed)
+        key = lambda movie: scores[movie.uri]
+    write_comparisons(session_paths(ratings_file)['comparisons'], ranked_rounds(movies, rounds, seed, key))
+    start = time.perf_counter()
+    changed = solve_ratings(ratings_file)
+    seconds = time.perf_counter() - start
+    # Solving again straight away must find nothing left to change
+    return changed, seconds, solve_ratings(ratings_file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time --solve on synthetic libraries, and check that rankings "
+                                                 "which all agree with the ratings change nothing.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rounds', type=int, default=2000, help="Ranked rounds in each comparisons log")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    failed = False
+    print(f"{'library':>10} {'rankings':>9} {'changed':>8} {'solve s':>8} {'again':>6}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            for order in ('agreeing', 'oracle'):
+                changed, seconds, again = time_solve(size, args.rounds, args.seed, workdir, order)
+                print(f"{size:>10} {order:>9} {changed:>8} {seconds:>8.2f} {again:>6}")
+                failed |= again != 0 or (order == 'agreeing' and changed != 0)
+    if failed:
+        print("Solving changed ratings it had no reason to")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
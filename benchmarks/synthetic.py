@@ -0,0 +1,53 @@
+import csv, random, string
+
+from lib.helper_functions import Movie
+
+RATINGS = [0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]
+# Roughly what a real export looks like: most films sit at 3.5-4.0
+RATING_WEIGHTS = [1, 1, 2, 3, 5, 9, 22, 28, 18, 11]
+
+URI_ALPHABET = string.digits + string.ascii_letters
+
+def make_uri(index):
+    uri_id = ''
+    while True:
+        index, digit = divmod(index, len(URI_ALPHABET))
+        uri_id = URI_ALPHABET[digit] + uri_id
+        if index == 0:
+            return f'https://boxd.it/{uri_id}'
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        if i and i % 500 == 0:
+            # Every 500th film reuses an earlier title and year, like same-named films in one year do
+            name, year = rows[rng.randrange(i)][1:3]
+        else:
+            name, year = f'Film {i}', rng.randint(1920, 2024)
+        date = f'20{rng.randint(12, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'
+        rows.append([date, name, year, make_uri(i), rng.choices(RATINGS, RATING_WEIGHTS)[0]])
+    return rows
+
+def make_movies(count, seed=1):
+    return [Movie(*row) for row in make_rows(count, seed)]
+
+def write_ratings_csv(filename, count, seed=1):
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Date', 'Name', 'Year', 'Letterboxd URI', 'Rating'])
+        writer.writerows(make_rows(count, seed))
+
+def oracle_scores(movies, seed=1, noise=0.75):
+    # Hidden "true" preference: the current rating plus noise, so the oracle disagrees with
+    # the ratings often enough for rounds to actually swap things
+    rng = random.Random(seed)
+    return {movie.uri: movie.rating + rng.gauss(0, noise) for movie in movies}
+
+def make_oracle(movies, seed=1, noise=0.75):
+    scores = oracle_scores(movies, seed, noise)
+
+    def rank(displayed_movies):
+        # Same format as the ranking entry: displayed positions from best to worst
+        return sorted(range(len(displayed_movies)), key=lambda i: -scores[displayed_movies[i].uri])
+    return rank
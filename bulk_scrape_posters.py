@@ -1,93 +1,115 @@
-import csv
-import time
+import argparse
 import os
 import logging
-import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Install and import 3rd-party libraries
-def install(package_name,import_name=None):
-    if import_name == None:
-        import_name = package_name
-    try:
-        importlib.import_module(import_name)
-    except ImportError:
-        print(f"{package_name} not found. Installing...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
+from lib.engine import DEFAULT_RATINGS_FILE
+from lib.helper_functions import get_poster_path, download_poster, iter_csv
+from lib.letterboxd_export import find_export, iter_export_movies
+from lib.http_client import HttpClient
+from lib.poster_resolver import PosterResolver
+from lib.poster_store import PosterStore, FETCHED, FAILED
+from lib.thumbnails import ThumbnailGenerator
 
-install('requests')
-install('beautifulsoup4','bs4')
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
 
-from bs4 import BeautifulSoup
-import requests
+def scrape_poster(resolver, poster_store, name, uri, retry_not_found=False):
+    filename = get_poster_path(name, uri)
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    poster_url = resolver.resolve(uri, retry_not_found)
+    if not poster_url:
+        logging.error(f"Poster not found for {name}")
+        poster_store.record_failed(uri, filename, 'not_found')
+        return 'not_found'
+    if download_poster(poster_url, filename, session=resolver.session):
+        poster_store.record_fetched(uri, filename)
+        return FETCHED
+    poster_store.record_failed(uri, filename, 'download_failed')
+    return FAILED
 
-def sanitize_filename(filename):
-    # Remove or replace characters that are invalid in filenames
-    return re.sub(r'[<>:"/\\|?*]', '_', filename)
+def needs_scrape(poster_store, uri, retry_not_found=False):
+    # The poster store doubles as the resume manifest: anything fetched is skipped,
+    # and films TMDB has no poster for are only retried when asked to
+    status = poster_store.status(uri)
+    if status == FETCHED:
+        return False
+    if status == FAILED and not retry_not_found:
+        return poster_store.get_error(uri) != 'not_found'
+    return True
 
-def get_headers():
-    return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
+def render_thumbnails(poster_store):
+    # CPU-bound, so this gets a process per core rather than threads
+    generator = ThumbnailGenerator(poster_store, max_workers=os.cpu_count())
+    try:
+        generator.submit_missing()
+        logging.info(f"Rendering thumbnails for {len(generator.pending)} posters")
+        generator.shutdown(wait=True)
+    except KeyboardInterrupt:
+        logging.info("Interrupted, rendered thumbnails are kept. Run again to resume.")
+        generator.shutdown(wait=False)
+        raise
 
-def download_poster(url, filename):
-    response = requests.get(url, headers=get_headers(), allow_redirects=True)
-    if response.status_code == 200:
-        content_type = response.headers.get('Content-Type', '')
-        if 'image' in content_type:
-            with open(filename, 'wb') as file:
-                file.write(response.content)
-            logging.info(f"Downloaded: {filename}")
-        else:
-            logging.error(f"Content is not an image for {filename}. Content-Type: {content_type}")
-    else:
-        logging.error(f"Failed to download: {filename}. Status code: {response.status_code}")
+def load_movies(file_path):
+    # A ratings CSV, or a Letterboxd export ZIP read in place
+    if zipfile.is_zipfile(file_path):
+        with zipfile.ZipFile(file_path) as archive:
+            return list(iter_export_movies(archive))
+    return list(iter_csv(file_path))
 
-def get_tmdb_poster_url(letterboxd_url):
-    response = requests.get(letterboxd_url, headers=get_headers(), allow_redirects=True)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        tmdb_link = soup.find('a', {'data-track-action': 'TMDb'})
-        if tmdb_link and 'href' in tmdb_link.attrs:
-            tmdb_url = tmdb_link['href']
-            tmdb_response = requests.get(tmdb_url, headers=get_headers(), allow_redirects=True)
-            if tmdb_response.status_code == 200:
-                tmdb_soup = BeautifulSoup(tmdb_response.text, 'html.parser')
-                og_image = tmdb_soup.find('meta', property='og:image')
-                if og_image and 'content' in og_image.attrs:
-                    return og_image['content']
-    return None
+def process_csv(file_path, workers=8, rate=2.0, retry_not_found=False, thumbnails=True):
+    poster_store = PosterStore()
+    client = HttpClient(pool_size=workers, rate=rate)
+    resolver = PosterResolver(client)
 
-def process_csv(file_path):
-    with open(file_path, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            letterboxd_url = row['Letterboxd URI']
-            movie_id = letterboxd_url.split('/')[-1]
-            movie_name = row['Name']
-            
-            logging.info(f"Processing: {row['Name']} ({letterboxd_url})")
-            
-            poster_url = get_tmdb_poster_url(letterboxd_url)
-            if poster_url:
-                filename = f"./images/{sanitize_filename(movie_name)}_{movie_id}.jpg"
-                download_poster(poster_url, filename)
-            else:
-                logging.error(f"Poster not found for {row['Name']}")
-            
-            # Delay to avoid overwhelming the server
-            time.sleep(1)
+    movies = [movie for movie in load_movies(file_path) if needs_scrape(poster_store, movie.uri, retry_not_found)]
+    logging.info(f"{len(movies)} movies left to scrape")
+
+    counts = {}
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scrape')
+    try:
+        futures = {
+            executor.submit(scrape_poster, resolver, poster_store, movie.name, movie.uri, retry_not_found): movie
+            for movie in movies
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            movie = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                logging.error(f"Error scraping {movie.name} ({movie.uri}): {e}")
+                status = FAILED
+            counts[status] = counts.get(status, 0) + 1
+            logging.info(f"[{done}/{len(movies)}] {movie.name}: {status}")
+        executor.shutdown(wait=True)
+        if thumbnails:
+            render_thumbnails(poster_store)
+    except KeyboardInterrupt:
+        logging.info("Interrupted, progress saved. Run again to resume.")
+    finally:
+        # Drop queued movies; only the few already in flight are waited on
+        executor.shutdown(wait=True, cancel_futures=True)
+        client.close()
+        resolver.close()
+        poster_store.close()
+
+    logging.info(f"Finished: {counts}")
 
 if __name__ == "__main__":
-    csv_file = "./db/original_ratings.csv"
+    parser = argparse.ArgumentParser(description="Scrape posters for every movie in a Letterboxd ratings export.")
+    parser.add_argument('csv_file', nargs='?', default=DEFAULT_RATINGS_FILE, help="Ratings CSV or Letterboxd export ZIP")
+    parser.add_argument('--workers', type=int, default=8, help="Number of concurrent downloads")
+    parser.add_argument('--rate', type=float, default=2.0, help="Requests per second allowed per host")
+    parser.add_argument('--retry-not-found', action='store_true', help="Retry movies that had no TMDB poster last time")
+    parser.add_argument('--no-thumbnails', action='store_true', help="Skip pre-rendering display-size thumbnails")
+    args = parser.parse_args()
+
+    csv_file = args.csv_file
+    if not os.path.exists(csv_file) and csv_file == DEFAULT_RATINGS_FILE:
+        # Not imported yet; read the export straight from its ZIP
+        csv_file = find_export(os.path.dirname(csv_file)) or csv_file
     if os.path.exists(csv_file):
-        process_csv(csv_file)
+        process_csv(csv_file, args.workers, args.rate, args.retry_not_found, not args.no_thumbnails)
     else:
-        logging.error(f"Error: {csv_file} not found in the current directory.")
+        logging.error(f"Error: {csv_file} not found.")
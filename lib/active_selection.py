@@ -0,0 +1,142 @@
+import heapq, itertools, random
+
+from lib.movie_bag import MovieBag
+
+SELECTION_STRATEGIES = ('random', 'active')
+
+# Rounds are drawn from this many neighbouring ratings, so every pair in a round is at most a star apart
+WINDOW_LEVELS = 3
+# Films considered at each rating before the pairs between them are scored
+CANDIDATES_PER_LEVEL = 4
+
+def swap_chance(confirmed):
+    # Even odds for a place that's never been checked, falling off each time a round confirms it
+    return 1 / (2 + confirmed)
+
+def confirmed_counts(confirmations, movie):
+    # (times confirmed above a lower rating, times confirmed below a higher one); a count only holds
+    # for the rating it was earned at
+    rating, above_lower, below_higher = confirmations.get(movie, (None, 0, 0))
+    if rating != movie.rating:
+        return 0, 0
+    return above_lower, below_higher
+
+def record_confirmations(confirmations, movies, old_ratings):
+    # After update_ratings: a film that kept its rating had its place confirmed against the higher
+    # and lower rated films it was shown with; one that moved starts over
+    for movie, old_rating in zip(movies, old_ratings):
+        if movie.rating != old_rating:
+            confirmations.pop(movie, None)
+            continue
+        above_lower, below_higher = confirmed_counts(confirmations, movie)
+        if any(other.rating < movie.rating for other in movies):
+            above_lower += 1
+        if any(other.rating > movie.rating for other in movies):
+            below_higher += 1
+        confirmations[movie] = (movie.rating, above_lower, below_higher)
+
+class ActiveBag(MovieBag):
+    # Draws each round from a window of neighbouring ratings, building it from the pairs of films most
+    # likely to swap: rounds like that change ratings, where films from far-apart ratings mostly confirm
+    # what's already obvious. Every film is still shown once a cycle. Each window is centred on the
+    # rating with the largest share of its films still in the bag, so the common ratings drain at the
+    # same pace as the rare ones and late rounds aren't left with ratings far apart
+    def __init__(self, movies=(), confirmations=None, graph=None):
+        self.confirmations = confirmations if confirmations is not None else {}
+        # The ComparisonGraph, if any, for what earlier rankings already say about a pair
+        self.graph = graph
+        # rating -> heap of (times confirmed, tiebreak, movie). Entries for films drawn since are
+        # dropped when they surface, so keeping it costs O(log n) per film rather than a rescan
+        self.heaps = {}
+        self.tiebreak = itertools.count()
+        super().__init__(movies)
+        self.cycle_sizes = self.bucket_sizes()
+
+    def bucket_sizes(self):
+        return {rating: len(bucket) for rating, bucket in self.buckets.items()}
+
+    def add(self, movie):
+        super().add(movie)
+        confirmed = sum(confirmed_counts(self.confirmations, movie))
+        # The random part of the key shuffles films nothing is known about
+        heapq.heappush(self.heaps.setdefault(movie.rating, []), (confirmed, random.random(), next(self.tiebreak), movie))
+
+    def least_confirmed(self, rating, count):
+        # Up to `count` films at this rating in the bag as (swap chance, movie), least confirmed
+        # first; they stay in the heap
+        heap = self.heaps[rating]
+        found, seen, kept = [], set(), []
+        while heap and len(found) < count:
+            entry = heapq.heappop(heap)
+            movie = entry[3]
+            position = self.positions.get(movie)
+            if position is None or position[0] != rating or movie in seen:
+                continue  # Drawn since, or an outdated entry from before it was put back
+            confirmed = sum(confirmed_counts(self.confirmations, movie))
+            if entry[0] != confirmed:
+                # Ranked while still in the bag (shown again by undo after a refill)
+                heapq.heappush(heap, (confirmed,) + entry[1:])
+                continue
+            seen.add(movie)
+            found.append((swap_chance(entry[0]), movie))
+            kept.append(entry)
+        for entry in kept:
+            heapq.heappush(heap, entry)
+        return found
+
+    def pair_swap_chance(self, lower, higher, steps):
+        # How likely a round is to swap a film with one rated `steps` half stars above it
+        if self.graph is not None:
+            if self.graph.known_above(higher.uri, lower.uri):
+                return 0.0  # Already ranked in rating order
+            if self.graph.known_above(lower.uri, higher.uri):
+                return 1.0  # Already ranked against it
+        # Otherwise from how often each has held its place in that direction, less likely the further
+        # apart the ratings are
+        _, lower_below_higher = confirmed_counts(self.confirmations, lower)
+        higher_above_lower, _ = confirmed_counts(self.confirmations, higher)
+        return swap_chance(lower_below_higher) * swap_chance(higher_above_lower) / steps
+
+    def draw_group(self, num_movies):
+        ratings = sorted(rating for rating, bucket in self.buckets.items() if bucket)
+        if len(ratings) < 2 or num_movies < 2:
+            return super().draw_group(num_movies)
+
+        width = min(WINDOW_LEVELS, len(ratings))
+        left = {rating: len(self.buckets[rating]) / self.cycle_sizes.get(rating, 1) for rating in ratings}
+        centre = max(ratings, key=lambda rating: (left[rating], random.random()))
+        windows = [ratings[start:start + width] for start in range(len(ratings) - width + 1)
+                   if centre in ratings[start:start + width]]
+        # The tightest window around it, ties broken at random
+        window = min(windows, key=lambda window: (window[-1] - window[0], random.random()))
+        # By the bucket each film was found in; a film ranked again while in the bag can be rated otherwise
+        level = {movie: rating for rating in window for _, movie in self.least_confirmed(rating, CANDIDATES_PER_LEVEL)}
+        candidates = list(level)
+        chances = {}
+        for i, first in enumerate(candidates):
+            for second in candidates[i + 1:]:
+                if level[first] != level[second]:
+                    lower, higher = sorted((first, second), key=level.get)
+                    steps = round((level[higher] - level[lower]) * 2)
+                    chances[first, second] = chances[second, first] = self.pair_swap_chance(lower, higher, steps)
+        pairs = [pair for pair in chances if level[pair[0]] == centre]
+        if not pairs:
+            return super().draw_group(num_movies)
+        # Start from the likeliest pair with a film from the centre rating, then keep adding the film
+        # likeliest to swap with those already in, held back the further its rating is ahead of the centre
+        selected = list(max(pairs, key=chances.get))
+        rest = [movie for movie in candidates if movie not in selected]
+        while rest and len(selected) < num_movies:
+            movie = max(rest, key=lambda movie: left[level[movie]] * sum(chances.get((movie, other), 0.0) for other in selected))
+            rest.remove(movie)
+            selected.append(movie)
+        for movie in selected:
+            self.remove(movie)
+        if len(selected) < num_movies:
+            selected += super().draw_group(num_movies - len(selected))
+        return selected
+
+    def refill(self, movies):
+        self.heaps.clear()
+        super().refill(movies)
+        self.cycle_sizes = self.bucket_sizes()
@@ -0,0 +1,141 @@
+import csv, logging, os, time
+
+from lib.comparison_graph import comparison_rounds
+from lib.engine import session_paths
+from lib.helper_functions import load_csv, save_csv
+from lib.journal import RatingJournal
+from lib.ratings_diff import RatingsDiff
+from lib.tournament import redistribute_ratings
+
+# Log-odds of beating a film rated one star lower, before any comparisons say otherwise
+RATING_SCALE = 1.0
+# Each film's virtual win and loss against an opponent as strong as its current rating: it stays
+# where its rating puts it until real comparisons outweigh them, and keeps the fit finite for films
+# that have won or lost every round
+PRIOR_GAMES = 1.0
+SOLVE_TOLERANCE = 1e-6
+SOLVE_MAX_ITERATIONS = 5000
+
+def get_numpy():
+    # Only --solve needs NumPy, so it isn't one of the packages --setup installs
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("numpy is not installed. Run `pip install numpy` to use --solve.") from None
+    return numpy
+
+def comparison_pairs(rounds, index):
+    # Every (winner, loser) pair a round implies, for films still in the library
+    winners, losers = [], []
+    for uris in rounds:
+        nodes = [index[uri] for uri in uris if uri in index]
+        for i, winner in enumerate(nodes):
+            for loser in nodes[i + 1:]:
+                winners.append(winner)
+                losers.append(loser)
+    return winners, losers
+
+def read_scores(filename):
+    # uri -> (score, rating the prior was anchored to, rating the fit handed out)
+    try:
+        with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader)  # Skip header
+            return {row[0]: (float(row[1]), float(row[2]), float(row[3])) for row in reader}
+    except OSError:
+        return {}
+
+def save_scores(filename, movies, scores, anchors):
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Letterboxd URI', 'Score', 'Anchor', 'Rating'])
+        for movie, score, anchor in zip(movies, scores.tolist(), anchors):
+            writer.writerow([movie.uri, score, anchor, movie.rating])
+    os.replace(temp_filename, filename)
+
+def fit_scores(anchors, winners, losers, initial=None):
+    # Bradley-Terry strengths by Hunter's MM iteration, as log-strengths. Every update is a handful of
+    # whole-array operations, so a pass over 100k comparisons takes a millisecond or two
+    np = get_numpy()
+    size = len(anchors)
+    anchor = np.exp(RATING_SCALE * np.asarray(anchors, dtype=float))
+    winners = np.asarray(winners, dtype=np.intp)
+    losers = np.asarray(losers, dtype=np.intp)
+    wins = np.bincount(winners, minlength=size) + PRIOR_GAMES
+    strength = anchor if initial is None else np.exp(np.asarray(initial, dtype=float))
+
+    for iteration in range(1, SOLVE_MAX_ITERATIONS + 1):
+        inverse = 1.0 / (strength[winners] + strength[losers])
+        games = (np.bincount(winners, inverse, size) + np.bincount(losers, inverse, size)
+                 + 2 * PRIOR_GAMES / (strength + anchor))
+        updated = wins / games
+        change = np.max(np.abs(np.log(updated / strength))) if size else 0.0
+        strength = updated
+        if change < SOLVE_TOLERANCE:
+            break
+    return np.log(strength), iteration
+
+def contradicted_films(ratings, scores, winners, losers):
+    # The films to re-rate: every film in a comparison its rating gets the wrong way round, plus any
+    # film that handing their ratings out along the fit would put the wrong way round against them.
+    # Films whose comparisons all agree with their ratings keep them, however the fit scores them
+    np = get_numpy()
+    ratings = np.asarray(ratings, dtype=float)
+    scores = np.asarray(scores, dtype=float)
+    winners = np.asarray(winners, dtype=np.intp)
+    losers = np.asarray(losers, dtype=np.intp)
+    current = ratings.copy()
+    chosen = np.zeros(len(ratings), dtype=bool)
+    while True:
+        wrong = current[winners] < current[losers]
+        found = np.zeros(len(ratings), dtype=bool)
+        found[winners[wrong]] = True
+        found[losers[wrong]] = True
+        found &= ~chosen
+        if not found.any():
+            return np.flatnonzero(chosen).tolist()
+        chosen |= found
+        members = np.flatnonzero(chosen)
+        order = members[np.lexsort((ratings[members], scores[members]))]
+        current[order] = np.sort(ratings[members])
+
+def solve_ratings(ratings_file):
+    # Refits the whole library to every comparison made so far. The films whose comparisons contradict
+    # their ratings get those ratings back along the fitted order, so the rating histogram stays
+    # exactly as it was. Returns the number of films changed
+    paths = session_paths(ratings_file)
+    if RatingJournal(paths['journal']).exists():
+        logging.error("A ranking session didn't finish; resume it and quit before solving")
+        return None
+
+    start = time.perf_counter()
+    movies = load_csv(ratings_file)
+    index = {movie.uri: i for i, movie in enumerate(movies)}
+    winners, losers = comparison_pairs(comparison_rounds(paths['comparisons']), index)
+    ratings = [movie.rating for movie in movies]
+    # Warm-started from the last fit. A film still on the rating that fit gave it keeps the prior it
+    # had then, so solving twice changes nothing; one re-rated since is anchored to its new rating
+    previous = read_scores(paths['scores'])
+    anchors, initial = [], []
+    for movie in movies:
+        score, anchor, fitted = previous.get(movie.uri, (None, None, None))
+        if fitted != movie.rating:
+            score, anchor = RATING_SCALE * movie.rating, movie.rating
+        anchors.append(anchor)
+        initial.append(score)
+    scores, iterations = fit_scores(anchors, winners, losers, initial)
+    logging.info(f"Fitted {len(movies)} films to {len(winners)} comparisons in {iterations} iterations "
+                 f"({time.perf_counter() - start:.2f} s)")
+
+    # Worst to best; films the fit can't tell apart keep their existing order
+    order = sorted(contradicted_films(ratings, scores, winners, losers), key=lambda i: (scores[i], ratings[i]))
+    changes = redistribute_ratings([movies[i] for i in order])
+    save_scores(paths['scores'], movies, scores, anchors)
+    if changes:
+        ratings_diff = RatingsDiff(dict(zip((movie.uri for movie in movies), ratings)))
+        for uri, _, _ in changes:
+            ratings_diff.mark(uri)
+        save_csv(ratings_file, movies)
+        ratings_diff.export(paths['diff'], {movie.uri: movie for movie in movies})
+    return len(changes)
@@ -0,0 +1,199 @@
+import csv, hashlib, os, pickle
+
+# A log row holding just this undoes the round before it
+UNDO_ROW = ['undo']
+
+def iter_bits(mask):
+    # Searching the binary string runs in C; peeling off the low bit of a wide int is O(width) per bit
+    bits = bin(mask)[:1:-1]
+    node = bits.find('1')
+    while node >= 0:
+        yield node
+        node = bits.find('1', node + 1)
+
+def read_log(path):
+    # The log's complete rows as raw bytes, leaving out a torn final row from a crash
+    if not os.path.exists(path):
+        return b''
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data[:data.rfind(b'\n') + 1]
+
+def parse_comparisons(data):
+    # A ranked round's URIs from best to worst, or UNDO_ROW, per row
+    return list(csv.reader(data.decode('utf-8').splitlines()))
+
+def read_comparisons(path):
+    return parse_comparisons(read_log(path))
+
+def comparison_rounds(path):
+    # The ranked rounds that still stand, each from best to worst
+    rounds = []
+    last_undone = True
+    for row in read_comparisons(path):
+        if row == UNDO_ROW:
+            if not last_undone:
+                rounds.pop()
+            last_undone = True
+        elif len(row) > 1:
+            rounds.append(row)
+            last_undone = False
+    return rounds
+
+def write_comparisons(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+
+class ComparisonGraph:
+    # Every ranked group, kept as "better than" edges between Letterboxd URIs, with the transitive
+    # closure maintained as it grows: above[n] and below[n] are bitsets of the nodes known to rank
+    # above and below node n. "Is A known to be above B" is then a single bit test. The log of rounds
+    # is append-only; the closure is saved beside it, so a load only replays rounds logged since then
+    def __init__(self, path, closure_path):
+        self.path = path
+        self.closure_path = closure_path
+        self.ids = {}
+        self.above = []
+        self.below = []
+        # The rounds recorded this session from best to worst, so undo knows what to take back
+        self.recorded = []
+        # The last round in the log, which an undo row after it takes back
+        self.last = None
+        self.unsaved = 0
+        self.file = None
+
+    def load(self):
+        data = read_log(self.path)
+        start = self.read_closure(data)
+        for row in parse_comparisons(data[start:]):
+            self.replay(row)
+            self.unsaved += 1
+        if os.path.exists(self.path) and os.path.getsize(self.path) != len(data):
+            # Cut the torn row off, or the next round would be appended onto the end of it
+            os.truncate(self.path, len(data))
+        if self.unsaved:
+            self.save_closure()
+        self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+
+    def replay(self, row):
+        if row == UNDO_ROW:
+            if self.last:
+                self.forget(self.last)
+            self.last = None
+        elif len(row) > 1:
+            self.add_round(row)
+            self.last = row
+
+    def read_closure(self, data):
+        # How much of the log the saved closure already covers; 0 if there isn't one that fits this log
+        try:
+            with open(self.closure_path, 'rb') as f:
+                closure = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return 0
+        size = closure['log_size']
+        if size > len(data) or hashlib.md5(data[:size]).hexdigest() != closure['log_digest']:
+            return 0  # The log was rewritten since, e.g. by a replay
+        self.ids, self.above, self.below, self.last = closure['ids'], closure['above'], closure['below'], closure['last']
+        return size
+
+    def save_closure(self):
+        if self.file:
+            self.file.flush()
+        data = read_log(self.path)
+        closure = {'log_size': len(data), 'log_digest': hashlib.md5(data).hexdigest(),
+                   'ids': self.ids, 'above': self.above, 'below': self.below, 'last': self.last}
+        temp_path = f"{self.closure_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(closure, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.closure_path)
+        self.unsaved = 0
+
+    def node(self, uri):
+        node = self.ids.get(uri)
+        if node is None:
+            node = self.ids[uri] = len(self.above)
+            self.above.append(0)
+            self.below.append(0)
+        return node
+
+    def add_edge(self, better, worse):
+        if self.above[worse] >> better & 1:
+            return
+        # Everything at or above `better` is now above everything at or below `worse`
+        ups = self.above[better] | 1 << better
+        downs = self.below[worse] | 1 << worse
+        for node in iter_bits(downs):
+            self.above[node] |= ups
+        for node in iter_bits(ups):
+            self.below[node] |= downs
+
+    def forget_node(self, node):
+        bit = ~(1 << node)
+        for other in iter_bits(self.above[node]):
+            self.below[other] &= bit
+        for other in iter_bits(self.below[node]):
+            self.above[other] &= bit
+        self.above[node] = self.below[node] = 0
+
+    def forget(self, uris):
+        for uri in uris:
+            if uri in self.ids:
+                self.forget_node(self.ids[uri])
+
+    def add_round(self, uris):
+        nodes = [self.node(uri) for uri in uris]
+        # A film placed against what was known about it starts over from this round; older answers
+        # about it give way. Taking them out of the closure exactly would mean replaying every round
+        for i, node in enumerate(nodes):
+            group_above = sum(1 << other for other in nodes[:i])
+            group_below = sum(1 << other for other in nodes[i + 1:])
+            if self.above[node] & group_below or self.below[node] & group_above:
+                self.forget_node(node)
+        # Consecutive pairs are enough; the closure supplies the rest
+        for better, worse in zip(nodes, nodes[1:]):
+            self.add_edge(better, worse)
+
+    def record(self, uris):
+        self.recorded.append(list(uris))
+        self.writer.writerow(uris)
+        self.file.flush()
+        self.add_round(uris)
+        self.last = list(uris)
+        self.unsaved += 1
+
+    def undo(self):
+        # What the films were known to be before that round isn't kept, so they start over
+        if not self.recorded:
+            return
+        self.forget(self.recorded.pop())
+        self.writer.writerow(UNDO_ROW)
+        self.file.flush()
+        self.last = None
+        self.unsaved += 1
+
+    def known_above(self, better, worse):
+        # Whether the rankings so far put URI `better` above URI `worse`
+        better, worse = self.ids.get(better), self.ids.get(worse)
+        return better is not None and worse is not None and bool(self.above[worse] >> better & 1)
+
+    def implied_order(self, movies):
+        # The group from best to worst if every pair in it is already known, else None
+        nodes = [self.ids.get(movie.uri) for movie in movies]
+        if None in nodes:
+            return None
+        group = sum(1 << node for node in nodes)
+        for node in nodes:
+            if bin((self.above[node] | self.below[node]) & group).count('1') != len(nodes) - 1:
+                return None
+        # The closure has no cycles, so the number of group members above each film is its place
+        places = [bin(self.above[node] & group).count('1') for node in nodes]
+        return [movie for _, movie in sorted(zip(places, movies), key=lambda pair: pair[0])]
+
+    def close(self):
+        if self.file:
+            if self.unsaved:
+                self.save_closure()
+            self.file.close()
+            self.file = None
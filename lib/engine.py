@@ -0,0 +1,695 @@
+import hashlib, json, logging, os, random
+from dataclasses import dataclass
+from typing import List, Optional
+
+from lib.active_selection import ActiveBag, record_confirmations
+from lib.comparison_graph import ComparisonGraph, read_comparisons
+from lib.helper_functions import Movie, load_csv, save_csv, create_movie_bag, select_movies, update_ratings
+from lib.journal import RatingJournal
+from lib.movie_bag import MovieBag
+from lib.placement import Placement
+from lib.profiling import RoundTimer, timed
+from lib.ratings_diff import RatingsDiff
+from lib.session import SessionSnapshot, library_fingerprint, pack_indices, unpack_indices
+from lib.tournament import TournamentSort, redistribute_ratings
+
+DEFAULT_RATINGS_FILE = './db/ratings.csv'
+
+# Rounds between folding the journal back into ratings.csv
+CHECKPOINT_INTERVAL_ROUNDS = 50
+
+# Rounds the comparison graph may settle in a row before one is shown anyway, so a fully known
+# library doesn't spin through bag cycles on a single submit
+IMPLIED_ROUNDS_LIMIT = 100
+
+# New films placed together in one Mode 2 round, and how many films such a shared round shows
+PLACEMENTS_PER_ROUND = 3
+SHARED_ROUND_SIZE = 6
+
+@dataclass
+class AppState:
+    bag_cycle_count: int = 1
+    total_ranked_count: int = 0
+    movies_in_bag: int = 0
+    selected_movies: List[Movie] = None
+    previous_movies: Optional[List[Movie]] = None
+    # Rounds whose order earlier answers already implied, applied without being shown
+    rounds_skipped: int = 0
+    fullscreen: bool = False
+
+def session_paths(ratings_file):
+    # Everything a session writes sits next to its ratings file, so separate libraries never share state
+    directory, filename = os.path.split(ratings_file)
+    stem = os.path.splitext(filename)[0]
+    return {
+        'journal': os.path.join(directory, f'{stem}.journal'),
+        'diff': os.path.join(directory, f'changed_{stem}.csv'),
+        'tournament': os.path.join(directory, f'{stem}.tournament.json'),
+        'session': os.path.join(directory, f'{stem}.session'),
+        'export': os.path.join(directory, f'{stem}.export.json'),
+        'export_base': os.path.join(directory, f'{stem}.export.csv'),
+        'merge_report': os.path.join(directory, f'merge_{stem}.csv'),
+        'comparisons': os.path.join(directory, f'{stem}.comparisons.csv'),
+        'comparison_closure': os.path.join(directory, f'{stem}.comparisons.closure'),
+        'scores': os.path.join(directory, f'{stem}.scores.csv'),
+    }
+
+def parse_ranking(text, num_movies):
+    # Display positions from best to worst, e.g. "31254"; empty keeps the shown order
+    if len(text) == 0:
+        text = "654321"[6-num_movies:6]
+    if num_movies and len(text) == num_movies and text.isdigit() and set(text) == set(map(str, range(1, num_movies + 1))):
+        return [int(r) - 1 for r in text]
+    return None
+
+def ratings_digest(movies):
+    digest = hashlib.md5()
+    for movie in movies:
+        digest.update(f'{movie.uri},{movie.rating}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+class TranscriptWriter:
+    # One JSON object per line: a header with the starting library and RNG seed, then every
+    # round's shown group and the order it was given, undos, and a digest of the final ratings
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def read_transcript(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return records[0], records[1:]
+
+class Frontend:
+    # A way of showing rounds to the user. Frontends read engine.state and call submit, undo and close
+    def __init__(self, engine):
+        self.engine = engine
+
+    def show_round(self):
+        raise NotImplementedError
+
+    def show_message(self, message):
+        raise NotImplementedError
+
+    def run(self):
+        raise NotImplementedError
+
+class RankingEngine:
+    # A ranking session without any display: the library, bag, rating updates, journal, diff,
+    # session snapshot and tournament
+    def __init__(self, mode, new_movies=(), ratings_file=DEFAULT_RATINGS_FILE, resume=False,
+                 round_timer=None, seed=None, transcript=None, selection='active'):
+        if seed is not None:
+            random.seed(seed)
+        self.mode = mode
+        self.selection = selection
+        # movie -> (rating, times confirmed above a lower rating, times confirmed below a higher one)
+        self.confirmations = {}
+        # Films ranked since the last session snapshot, whose confirmation counts it still has to save
+        self.unsaved_confirmations = set()
+        # Rounds applied from the comparison graph since the last submission, which an undo of it takes
+        # back: (films, their ratings before, their confirmation counts before). Only mode 1 rounds
+        # change ratings; the other modes keep None for both
+        self.implied = []
+        self.new_movies = list(new_movies)
+        self.resume = resume
+        self.round_timer = round_timer or RoundTimer()
+        self.state = AppState()
+        self.transcript = transcript
+        self.tournament_result = None
+
+        paths = session_paths(ratings_file)
+        self.original_file = ratings_file
+        self.diff_file = paths['diff']
+        self.tournament_file = paths['tournament']
+        self.journal = RatingJournal(paths['journal'])
+        self.session = SessionSnapshot(paths['session'])
+        self.comparisons = ComparisonGraph(paths['comparisons'], paths['comparison_closure'])
+        self.load()
+
+        for movie in self.new_movies:
+            # Not in ratings.csv, so the diff picks them up as added films
+            self.movies_by_uri[movie.uri] = movie
+            self.ratings_diff.mark(movie.uri)
+        if self.transcript:
+            self.transcript.write({
+                'mode': self.mode,
+                'seed': seed,
+                'resumed': self.resume,
+                'selection': self.selection,
+                # Earlier answers decide which rounds get skipped, so a replay needs them too
+                'comparisons': read_comparisons(self.comparisons.path),
+                'new_movies': [(movie.date, movie.name, movie.year, movie.uri, movie.rating) for movie in self.new_movies],
+                'library': [(movie.date, movie.name, movie.year, movie.uri, movie.rating) for movie in self.movies],
+            })
+
+    def load(self):
+        self.movies = load_csv(self.original_file)
+        session_records = self.session.read_records() if self.resume and self.session.exists() else []
+        if session_records:
+            self.restore_new_movies(session_records)
+        self.movies_by_uri = {movie.uri: movie for movie in self.movies}
+        self.ratings_diff = RatingsDiff.from_movies(self.movies)
+
+        # A leftover journal means the last session never reached close(); replay it
+        if self.journal.exists():
+            replayed = self.journal.replay(self.movies)
+            for uri, original_rating in self.journal.original_ratings().items():
+                self.ratings_diff.set_baseline(uri, original_rating)
+                self.ratings_diff.mark(uri)
+            logging.info(f"Recovered {replayed} rating changes from an unfinished session")
+        self.journal.open()
+        self.round_id = self.journal.last_round
+        self.comparisons.load()
+
+        self.movie_index = {movie: i for i, movie in enumerate(self.movies)}
+        self.saved_placements = None
+        if not (session_records and self.restore_session(session_records)):
+            self.bag = self.create_bag(self.movies)
+        self.bag.track_changes()
+        self.state.movies_in_bag = len(self.bag)
+
+        self.tournament = None
+        if self.mode == "3":
+            uris = [movie.uri for movie in self.movies]
+            if os.path.exists(self.tournament_file):
+                self.tournament = TournamentSort.load(self.tournament_file, uris)
+                logging.info(f"Resuming tournament after {self.tournament.rounds} rounds")
+            else:
+                self.tournament = TournamentSort.start(uris)
+
+        # One search per new film; they share rounds
+        self.placements = []
+        if self.mode == "2":
+            saved = self.saved_placements or [{}] * len(self.new_movies)
+            self.placements = [Placement(self.movies, movie, **state) for movie, state in zip(self.new_movies, saved)]
+
+    def restore_new_movies(self, records):
+        base = records[0]
+        # Snapshots from before batches held a single 'new_movie'
+        rows = base.get('new_movies') or ([base['new_movie']] if base.get('new_movie') else [])
+        if not rows:
+            return
+        ratings = [row[4] for row in rows]
+        for delta in records[1:]:
+            ratings = delta.get('new_movie_ratings', ratings)
+        if [movie.uri for movie in self.movies[-len(rows):]] == [row[3] for row in rows]:
+            # Saved to ratings.csv when the session was closed; they stay the films being placed
+            self.new_movies = self.movies[-len(rows):]
+            del self.movies[-len(rows):]
+        else:
+            self.new_movies = [Movie(*row[:4], rating) for row, rating in zip(rows, ratings)]
+
+    def restore_session(self, records):
+        base = records[0]
+        if base['library_size'] != len(self.movies) or base['fingerprint'] != library_fingerprint(self.movies):
+            logging.warning("Ratings file has changed since the last session; starting a fresh bag")
+            return False
+
+        in_bag = set(unpack_indices(base['bag']))
+        confirmations = dict(base.get('confirmations', {}))
+        for delta in records[1:]:
+            in_bag.difference_update(unpack_indices(delta['removed']))
+            in_bag.update(unpack_indices(delta['added']))
+            confirmations.update(delta.get('confirmations', {}))
+        latest = records[-1]
+        self.confirmations = {self.movies[i]: counts for i, counts in confirmations.items() if counts is not None}
+
+        upcoming = [self.movies_from_indices(group) for group in latest['upcoming']]
+        in_bag = [self.movies[i] for i in sorted(in_bag)]
+        if self.uses_active_selection():
+            self.bag = ActiveBag.restore(in_bag, upcoming, confirmations=self.confirmations, graph=self.comparisons)
+        else:
+            self.bag = MovieBag.restore(in_bag, upcoming)
+        self.state.bag_cycle_count = latest['bag_cycle_count']
+        self.state.total_ranked_count = latest['total_ranked_count']
+        self.state.rounds_skipped = latest.get('rounds_skipped', 0)
+        # Snapshots from before placement searches start the search over
+        self.saved_placements = latest.get('placements')
+        self.implied = [(self.movies_from_indices(indices), ratings, counts)
+                        for indices, ratings, counts in latest.get('implied', [])]
+        if self.mode != "3":
+            # The tournament keeps its own state; its current group is redrawn from that
+            self.state.selected_movies = self.movies_from_indices(latest['selected'])
+            if latest['previous'] is not None:
+                self.state.previous_movies = self.movies_from_indices(latest['previous'])
+        logging.info(f"Resumed session: {self.state.total_ranked_count} ranked, {len(self.bag)} films left in the bag")
+        return True
+
+    def uses_active_selection(self):
+        # Mode 2 keeps rounds spread across the ratings, which brackets its new film faster
+        return self.selection == 'active' and self.mode == "1"
+
+    def create_bag(self, movies):
+        if self.uses_active_selection():
+            return ActiveBag(movies, self.confirmations, self.comparisons)
+        return create_movie_bag(movies)
+
+    def movie_indices(self, movies):
+        # New films aren't in ratings.csv, so they count down from -1
+        return [self.movie_index[movie] if movie in self.movie_index else -1 - self.new_movies.index(movie)
+                for movie in movies]
+
+    def movies_from_indices(self, indices):
+        return [self.movies[i] if i >= 0 else self.new_movies[-1 - i] for i in indices]
+
+    def session_state(self):
+        return {
+            'bag_cycle_count': self.state.bag_cycle_count,
+            'total_ranked_count': self.state.total_ranked_count,
+            'rounds_skipped': self.state.rounds_skipped,
+            'selected': self.movie_indices(self.state.selected_movies or []),
+            'previous': self.movie_indices(self.state.previous_movies) if self.state.previous_movies else None,
+            'upcoming': [self.movie_indices(group) for group in self.bag.upcoming],
+            'new_movie_ratings': [movie.rating for movie in self.new_movies],
+            'placements': [placement.state() for placement in self.placements],
+            'implied': [(self.movie_indices(movies), ratings, counts) for movies, ratings, counts in self.implied],
+        }
+
+    @timed('submit_ranking.session')
+    def save_session(self, full=False):
+        refilled, changes = self.bag.take_changes()
+        if full or refilled or self.session.deltas is None or self.session.deltas >= CHECKPOINT_INTERVAL_ROUNDS:
+            self.session.write_base({
+                'mode': self.mode,
+                'library_size': len(self.movies),
+                'fingerprint': library_fingerprint(self.movies),
+                'new_movies': [(movie.date, movie.name, movie.year, movie.uri, movie.rating) for movie in self.new_movies],
+                'bag': pack_indices(self.movie_indices(self.bag.positions)),
+                'confirmations': {self.movie_index[movie]: counts for movie, counts in self.confirmations.items()
+                                  if movie in self.movie_index},
+                **self.session_state(),
+            })
+        else:
+            # Only the films just ranked can have new confirmation counts
+            self.session.append({
+                'added': pack_indices(self.movie_indices(movie for movie, added in changes.items() if added)),
+                'removed': pack_indices(self.movie_indices(movie for movie, added in changes.items() if not added)),
+                'confirmations': {self.movie_index[movie]: self.confirmations.get(movie)
+                                  for movie in self.unsaved_confirmations if movie in self.movie_index},
+                **self.session_state(),
+            })
+        self.unsaved_confirmations.clear()
+
+    def start(self):
+        # A resumed session picks up on the round that was showing
+        if not self.state.selected_movies:
+            self.next_round()
+
+    @timed('next_round')
+    def next_round(self):
+        self.implied = []
+        if self.tournament:
+            self.next_tournament_round()
+            return
+        if self.placements:
+            self.next_placement_round()
+            return
+
+        self.draw_round()
+        # Groups whose whole order earlier answers already imply are applied without asking
+        for _ in range(IMPLIED_ROUNDS_LIMIT):
+            with self.round_timer.stage('next_round.implied_order'):
+                order = self.comparisons.implied_order(self.state.selected_movies)
+            if order is None:
+                break
+            movies = self.state.selected_movies
+            self.implied.append((movies, [movie.rating for movie in movies], [self.confirmations.get(movie) for movie in movies]))
+            self.rank_selected([movies.index(movie) for movie in order])
+            self.state.rounds_skipped += 1
+            self.draw_round()
+
+    def draw_round(self):
+        if len(self.bag) < 2:
+            self.bag.refill(self.movies)
+            self.state.bag_cycle_count += 1
+
+        num_movies = min(5, len(self.bag))
+        with self.round_timer.stage('next_round.select_movies'):
+            self.state.selected_movies = select_movies(self.bag, num_movies)
+
+        self.state.movies_in_bag = len(self.bag)
+        self.state.selected_movies.sort(key=lambda movie: movie.rating)
+
+    def next_tournament_round(self):
+        group = self.tournament.group()
+        # Undo takes back the last round the user ranked, not the ones settled from the graph after it
+        previous = self.tournament.previous
+        while group is not None:
+            movies = [self.movies_by_uri[uri] for uri in group]
+            order = self.comparisons.implied_order(movies)
+            if order is None:
+                break
+            self.implied.append((movies, None, None))
+            self.tournament.submit([movie.uri for movie in order])
+            self.state.rounds_skipped += 1
+            group = self.tournament.group()
+        if self.tournament.previous is not previous:
+            self.tournament.previous = previous
+            self.tournament.save(self.tournament_file)
+        if group is None:
+            self.finish_tournament()
+            return
+        self.state.selected_movies = [self.movies_by_uri[uri] for uri in group]
+        self.state.selected_movies.sort(key=lambda movie: movie.rating)
+
+    def open_placements(self):
+        return [placement for placement in self.placements if not placement.converged]
+
+    def placement_round(self):
+        # The films placed in the fewest rounds so far share the next one, each bringing its own
+        # companions. A tie-band round needs films from both sides of its boundary, so it isn't shared
+        placements = sorted(self.open_placements(), key=lambda placement: placement.rounds)
+        if placements and placements[0].band:
+            placements = placements[:1]
+        else:
+            placements = [placement for placement in placements if not placement.band][:PLACEMENTS_PER_ROUND]
+        count = SHARED_ROUND_SIZE // len(placements) - 1 if len(placements) > 1 else None
+        group = []
+        for placement in placements:
+            group.append(placement.new_movie)
+            companions = [movie for movie in placement.companions(count) if movie not in group]
+            if count and len(companions) < count:
+                # Another film's search already brought these; spread this one's further through its interval
+                companions = [movie for movie in placement.companions(2 * count) if movie not in group][:count]
+            group += companions
+        return placements, group
+
+    def shown_placements(self, movies):
+        return [placement for placement in self.open_placements() if placement.new_movie in movies]
+
+    def next_placement_round(self):
+        # Undo takes back the last round the user ranked, not the ones settled from the graph after it
+        previous = [placement.previous for placement in self.placements]
+        placements, group = self.placement_round()
+        while group:
+            order = self.comparisons.implied_order(group)
+            if order is None:
+                break
+            self.implied.append((group, None, None))
+            self.place(placements, order)
+            self.state.rounds_skipped += 1
+            placements, group = self.placement_round()
+        for placement, saved in zip(self.placements, previous):
+            placement.previous = saved
+        if not group:
+            self.state.selected_movies = []
+            self.state.previous_movies = None
+            return
+        self.state.selected_movies = sorted(group, key=lambda movie: movie.rating)
+
+    def place(self, placements, order):
+        # Only the new films' ratings are in question; the films they're shown with keep theirs
+        for placement in placements:
+            placement.submit(order)
+            if placement.converged:
+                placement.new_movie.rating = placement.rating
+                logging.info(f"Placed {placement.new_movie.name} at {placement.rating} after {placement.rounds} rounds")
+
+    def placement_progress(self):
+        open_placements = self.open_placements()
+        if len(self.placements) == 1:
+            placement = self.placements[0]
+            if placement.converged:
+                return f"Placed: {placement.new_movie.name} is a {placement.rating} (after {placement.rounds} rounds)"
+            return f"Placing {placement.new_movie.name}: about {placement.rounds_left()} rounds left"
+        if not open_placements:
+            return f"Placed all {len(self.placements)} films"
+        # Rounds are shared, so the films still open need about their longest search
+        rounds_left = max(placement.rounds_left() for placement in open_placements) \
+            * -(-len(open_placements) // PLACEMENTS_PER_ROUND)
+        return f"Placed: {len(self.placements) - len(open_placements)}/{len(self.placements)} films (about {rounds_left} rounds left)"
+
+    def progress(self):
+        # A line on how far mode 2 or 3 has got; mode 1 has no end
+        if self.tournament:
+            return self.tournament_progress()
+        if self.placements:
+            return self.placement_progress()
+        return None
+
+    def finish_tournament(self):
+        ordered = [self.movies_by_uri[uri] for uri in self.tournament.ranked]
+        changes = redistribute_ratings(ordered)
+        self.round_id += 1
+        if changes:
+            self.journal.append(self.round_id, changes)
+            for uri, _, _ in changes:
+                self.ratings_diff.mark(uri)
+        self.checkpoint()
+        os.remove(self.tournament_file)
+        logging.info(f"Tournament finished after {self.tournament.rounds} rounds; {len(changes)} ratings changed")
+
+        self.tournament_result = len(changes)
+        self.state.selected_movies = []
+        self.state.previous_movies = None
+
+    def tournament_progress(self):
+        if self.tournament_result is not None:
+            return f"Tournament complete: {self.tournament_result} ratings changed"
+        placed, total = self.tournament.progress()
+        return f"Placed: {placed}/{total} (about {self.tournament.rounds_left()} rounds left)"
+
+    def upcoming(self, num_rounds):
+        # Films likely to be shown soon, for fetching their posters ahead of time
+        if self.tournament:
+            # The pivots are mostly films already shown; the films waiting to be placed are what's new
+            return [self.movies_by_uri[uri] for uri in self.tournament.upcoming(num_rounds)]
+        if self.placements:
+            return [movie for placement in self.placement_round()[0] for movie in placement.upcoming()]
+        return self.bag.peek(num_rounds)
+
+    def next_round_preview(self):
+        # The round submit() will draw next, when it's already been peeked and no rating change can
+        # alter it; lets a frontend show it before the submission has round-tripped
+        if self.tournament or self.placements or len(self.bag) < 2:
+            return None
+        self.bag.peek(1)
+        group = list(self.bag.upcoming[0]) if self.bag.upcoming else []
+        if len(group) != min(5, len(self.bag)):
+            return None
+        if self.comparisons.implied_order(group) is not None:
+            return None  # Won't be shown
+        return sorted(group, key=lambda movie: movie.rating)
+
+    def force_round(self, uris):
+        # Replace the drawn round with a given one, putting the drawn films back in the bag
+        for movie in self.state.selected_movies:
+            if movie not in self.new_movies and movie not in self.bag:
+                self.bag.add(movie)
+        self.state.selected_movies = [self.movies_by_uri[uri] for uri in uris]
+        for movie in self.state.selected_movies:
+            if movie in self.bag.positions:
+                self.bag.remove(movie)
+        self.state.movies_in_bag = len(self.bag)
+        self.state.selected_movies.sort(key=lambda movie: movie.rating)
+
+    @timed('submit_ranking.engine')
+    def submit(self, ranking):
+        if self.transcript:
+            self.transcript.write({
+                'group': [movie.uri for movie in self.state.selected_movies],
+                'order': [self.state.selected_movies[i].uri for i in ranking],
+            })
+        self.record_comparisons(ranking)
+        if self.tournament:
+            self.record_tournament_round(ranking)
+            self.state.total_ranked_count += len(self.state.selected_movies)
+        elif self.placements:
+            self.place(self.shown_placements(self.state.selected_movies), [self.state.selected_movies[i] for i in ranking])
+            self.state.total_ranked_count += len(self.state.selected_movies)
+        else:
+            self.rank_selected(ranking)
+            # Rounds settled from the graph aren't counted; the user never ranked them
+            self.state.total_ranked_count += len(self.state.selected_movies)
+        self.state.previous_movies = self.state.selected_movies
+        self.next_round()
+        self.save_session()
+
+    def rank_selected(self, ranking):
+        old_ratings = [movie.rating for movie in self.state.selected_movies]
+        with self.round_timer.stage('submit_ranking.update_ratings'):
+            update_ratings(self.state.selected_movies, ranking)
+        record_confirmations(self.confirmations, self.state.selected_movies, old_ratings)
+        self.unsaved_confirmations.update(self.state.selected_movies)
+        self.record_changes(self.state.selected_movies, old_ratings)
+
+    @timed('submit_ranking.comparisons')
+    def record_comparisons(self, ranking):
+        self.comparisons.record([self.state.selected_movies[i].uri for i in ranking])
+
+    @timed('submit_ranking.journal')
+    def record_changes(self, movies, old_ratings):
+        self.round_id += 1
+        changes = [
+            (movie.uri, old_rating, movie.rating)
+            for movie, old_rating in zip(movies, old_ratings)
+            if movie.rating != old_rating
+        ]
+        if changes:
+            self.journal.append(self.round_id, changes)
+            for uri, _, _ in changes:
+                self.ratings_diff.mark(uri)
+        if self.round_id % CHECKPOINT_INTERVAL_ROUNDS == 0:
+            self.checkpoint()
+
+    @timed('submit_ranking.tournament')
+    def record_tournament_round(self, ranking):
+        # Ratings stay put until the final order is known; the round only moves the sort forward
+        self.tournament.submit([self.state.selected_movies[i].uri for i in ranking])
+        self.tournament.save(self.tournament_file)
+
+    @timed('submit_ranking.checkpoint')
+    def checkpoint(self):
+        save_csv(self.original_file, self.movies)
+        self.journal.compact()
+        self.ratings_diff.export(self.diff_file, self.movies_by_uri)
+
+    def export_diff(self):
+        return self.ratings_diff.export(self.diff_file, self.movies_by_uri)
+
+    def undo(self):
+        if self.state.previous_movies is None:
+            return False
+        if self.transcript:
+            self.transcript.write({'undo': True})
+        self.comparisons.undo()
+        self.revert_implied()
+        if self.tournament:
+            self.tournament.undo()
+            self.tournament.save(self.tournament_file)
+            self.state.total_ranked_count -= len(self.state.previous_movies)
+            self.state.previous_movies = None
+            self.next_round()
+        elif self.placements:
+            for placement in self.placements:
+                if placement.new_movie in self.state.previous_movies:
+                    placement.undo()
+            self.state.total_ranked_count -= len(self.state.previous_movies)
+            self.state.previous_movies = None
+            self.next_round()
+        else:
+            for movie in self.state.selected_movies:
+                if movie not in self.new_movies:
+                    self.bag.add(movie)
+                    self.state.total_ranked_count -= 1
+            self.state.selected_movies = self.state.previous_movies
+            self.state.previous_movies = None
+            self.state.movies_in_bag = len(self.bag)
+            self.state.selected_movies.sort(key=lambda movie: movie.rating)
+        self.save_session()
+        return True
+
+    def revert_implied(self):
+        # Rounds settled from the graph on the strength of the answer being undone go with it, and
+        # their films go back in the bag under the ratings they're restored to
+        self.state.rounds_skipped -= len(self.implied)
+        for movies, old_ratings, old_counts in reversed(self.implied):
+            if old_ratings is None:
+                continue  # Modes 2 and 3 roll their own state back
+            ratings = [movie.rating for movie in movies]
+            for movie, rating, counts in zip(movies, old_ratings, old_counts):
+                if movie in self.bag.positions:
+                    self.bag.remove(movie)  # Put back by a refill since, under the rating being undone
+                movie.rating = rating
+                if counts is None:
+                    self.confirmations.pop(movie, None)
+                else:
+                    self.confirmations[movie] = counts
+                if movie not in self.bag:
+                    self.bag.add(movie)
+            self.unsaved_confirmations.update(movies)
+            self.record_changes(movies, ratings)
+        self.implied = []
+        self.state.movies_in_bag = len(self.bag)
+
+    def apply_export_merge(self, merge):
+        # Only the films the export changed are touched; the bag, counters and undo carry on
+        if not merge:
+            return
+        removed = set(merge.removed)
+        for movie in merge.removed:
+            del self.movies_by_uri[movie.uri]
+            self.bag.discard(movie)
+            self.ratings_diff.forget(movie.uri)
+            if self.tournament:
+                self.tournament.discard(movie.uri)
+        if removed:
+            self.movies = [movie for movie in self.movies if movie not in removed]
+            self.movie_index = {movie: i for i, movie in enumerate(self.movies)}
+
+        for movie in merge.added:
+            self.movie_index[movie] = len(self.movies)
+            self.movies.append(movie)
+            self.movies_by_uri[movie.uri] = movie
+            self.ratings_diff.set_baseline(movie.uri, movie.rating)
+            self.bag.add(movie)
+            if self.tournament:
+                self.tournament.add(movie.uri)
+
+        if merge.rerated:
+            self.round_id += 1
+            self.journal.append(self.round_id, [(movie.uri, old, new) for movie, old, new in merge.rerated])
+        for movie, _, new in merge.rerated:
+            # Bag buckets are keyed by rating, so a film waiting in one moves to its new bucket
+            in_bag = movie in self.bag.positions
+            if in_bag:
+                self.bag.remove(movie)
+            movie.rating = new
+            if in_bag:
+                self.bag.add(movie)
+            self.ratings_diff.set_baseline(movie.uri, new)
+        for movie, _, exported in merge.conflicts:
+            # The ranked rating wins and stays in the diff, to be imported over Letterboxd's
+            self.ratings_diff.set_baseline(movie.uri, exported)
+            self.ratings_diff.mark(movie.uri)
+
+        if self.state.previous_movies and removed.intersection(self.state.previous_movies):
+            self.state.previous_movies = None
+        selected = self.state.selected_movies or []
+        if self.open_placements():
+            # The sorted library has shifted under the searches, so the unfinished ones start over
+            self.placements = [placement if placement.converged else Placement(self.movies, placement.new_movie)
+                               for placement in self.placements]
+            self.state.previous_movies = None
+            self.next_placement_round()
+        elif self.tournament and removed:
+            # Removing ranked films moves the pivots, so the shown group is redrawn
+            self.state.previous_movies = None
+            self.tournament.save(self.tournament_file)
+            self.next_tournament_round()
+        elif self.tournament and merge.added:
+            self.tournament.save(self.tournament_file)
+        elif removed.intersection(selected):
+            for movie in selected:
+                if movie not in removed and movie not in self.new_movies:
+                    self.bag.add(movie)
+            self.next_round()
+        else:
+            selected.sort(key=lambda movie: movie.rating)
+        self.state.movies_in_bag = len(self.bag)
+
+        self.checkpoint()
+        self.save_session(full=True)
+
+    def all_movies(self):
+        return self.movies + self.new_movies
+
+    def close(self):
+        count = self.ratings_diff.export(self.diff_file, self.movies_by_uri)
+        save_csv(self.original_file, self.all_movies())
+        self.journal.remove()
+        # Compacted to a single record, so the next launch restores without replaying anything
+        self.save_session(full=True)
+        self.session.close()
+        self.comparisons.close()
+        if self.transcript:
+            self.transcript.write({'final': ratings_digest(self.all_movies())})
+            self.transcript.close()
+        return count
@@ -1,7 +1,13 @@
-import hashlib, random, csv, re, logging, os, importlib, subprocess, sys, shutil
-from collections import deque
+import hashlib, csv, re, logging, os, importlib, subprocess, sys
 from datetime import datetime
+from html.parser import HTMLParser
 
+from lib.movie_bag import MovieBag
+from lib.ratings_diff import compare_files
+
+
+# (pip package, import name); installed by `python snekboxd.py --setup` rather than on every import
+REQUIRED_PACKAGES = [('Pillow', 'PIL'), ('requests', 'requests'), ('screeninfo', 'screeninfo')]
 
 def install(package_name,import_name=None):
     if import_name == None:
@@ -12,32 +18,45 @@ def install(package_name,import_name=None):
         print(f"{package_name} not found. Installing...")
         subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
 
-install('requests')
-import requests
+def install_dependencies():
+    for package_name, import_name in REQUIRED_PACKAGES:
+        install(package_name, import_name)
+
+def get_requests():
+    # requests is only needed once something actually goes to the network
+    try:
+        import requests
+    except ImportError:
+        raise ImportError("requests is not installed. Run `python snekboxd.py --setup` first.") from None
+    return requests
 
-install('beautifulsoup4','bs4')
-from bs4 import BeautifulSoup
 
 class Movie:
+    # Libraries run to tens of thousands of films, so skip the per-instance __dict__
+    __slots__ = ('date', 'name', 'year', 'uri', 'rating', '_image_path')
+
     def __init__(self, date, name, year, uri, rating):
         self.date = date
         self.name = name
         self.year = year
         self.uri = uri
         self.rating = float(rating)
-        self.image_path = self.get_image_path()
+        self._image_path = None
+
+    @property
+    def image_path(self):
+        # Resolved on first display rather than for every row at load time
+        if self._image_path is None:
+            self._image_path = self.get_image_path()
+        return self._image_path
 
     def get_image_path(self):
-        uri_id = self.uri.split('/')[-1]
-        image_path = f'./images/{sanitize_filename(self.name)} ({uri_id}).jpg'
-        if not os.path.exists(image_path):
-            no_image_path = './assets/no_image.jpg'
-            if os.path.exists(no_image_path):
-                shutil.copy(no_image_path, image_path)
-                return image_path
-            else:
-                return None
-        return image_path
+        # Where the poster lives once fetched; PosterStore knows whether it actually has been
+        return get_poster_path(self.name, self.uri)
+
+def get_poster_path(name, uri):
+    uri_id = uri.split('/')[-1]
+    return f'./images/{sanitize_filename(name)} ({uri_id}).jpg'
 
 def get_file_md5(filename):
     hash_md5 = hashlib.md5()
@@ -56,13 +75,17 @@ def get_headers():
         'Upgrade-Insecure-Requests': '1',
     }
 
-def download_poster(url, filename):
-    response = requests.get(url, headers=get_headers(), allow_redirects=True)
+def download_poster(url, filename, session=None):
+    session = session or get_requests()
+    response = session.get(url, headers=get_headers(), allow_redirects=True)
     if response.status_code == 200:
         content_type = response.headers.get('Content-Type', '')
         if 'image' in content_type:
-            with open(filename, 'wb') as file:
+            # Write beside the target and swap it in, so the GUI never reads a half-written poster
+            temp_filename = f"{filename}.part"
+            with open(temp_filename, 'wb') as file:
                 file.write(response.content)
+            os.replace(temp_filename, filename)
             logging.info(f"Downloaded: {filename}")
             return True
         else:
@@ -71,31 +94,69 @@ def download_poster(url, filename):
         logging.error(f"Failed to download: {filename}. Status code: {response.status_code}")
     return False
 
-def get_tmdb_poster_url(letterboxd_url):
-    response = requests.get(letterboxd_url, headers=get_headers(), allow_redirects=True)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        tmdb_link = soup.find('a', {'data-track-action': 'TMDb'})
-        if tmdb_link and 'href' in tmdb_link.attrs:
-            tmdb_url = tmdb_link['href']
-            tmdb_response = requests.get(tmdb_url, headers=get_headers(), allow_redirects=True)
-            if tmdb_response.status_code == 200:
-                tmdb_soup = BeautifulSoup(tmdb_response.text, 'html.parser')
-                og_image = tmdb_soup.find('meta', property='og:image')
-                if og_image and 'content' in og_image.attrs:
-                    return og_image['content']
+class TagFound(Exception):
+    pass
+
+class TagAttributeFinder(HTMLParser):
+    # Stops at the first matching tag instead of building a whole document tree
+    def __init__(self, tag, match_attrs, value_attr):
+        super().__init__()
+        self.tag = tag
+        self.match_attrs = match_attrs
+        self.value_attr = value_attr
+        self.value = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != self.tag:
+            return
+        attrs = dict(attrs)
+        if self.value_attr in attrs and all(attrs.get(k) == v for k, v in self.match_attrs.items()):
+            self.value = attrs[self.value_attr]
+            raise TagFound()
+
+def find_tag_attribute(url, tag, match_attrs, value_attr, session=None):
+    session = session or get_requests()
+    response = session.get(url, headers=get_headers(), allow_redirects=True, stream=True)
+    try:
+        if response.status_code != 200:
+            return None
+        response.encoding = response.encoding or 'utf-8'
+        finder = TagAttributeFinder(tag, match_attrs, value_attr)
+        # Feed the page as it arrives and hang up as soon as the tag turns up
+        for chunk in response.iter_content(chunk_size=16384, decode_unicode=True):
+            finder.feed(chunk)
+    except TagFound:
+        return finder.value
+    finally:
+        response.close()
     return None
 
-def shuffle_deque(d):
-    l = list(d)
-    random.shuffle(l)
-    d.clear()
-    d.extend(l)
+def get_tmdb_url(letterboxd_url, session=None):
+    return find_tag_attribute(letterboxd_url, 'a', {'data-track-action': 'TMDb'}, 'href', session)
+
+def get_og_image_url(tmdb_url, session=None):
+    return find_tag_attribute(tmdb_url, 'meta', {'property': 'og:image'}, 'content', session)
+
+def get_tmdb_poster_url(letterboxd_url, session=None):
+    tmdb_url = get_tmdb_url(letterboxd_url, session)
+    if tmdb_url:
+        return get_og_image_url(tmdb_url, session)
+    return None
 
 def sanitize_filename(filename):
     # Remove or replace characters that are invalid in filenames
     return re.sub(r'[<>:"/\\|?*]', '_', filename)
 
+# Shortened Letterboxd film URL, as in the Letterboxd URI column of an export
+URI_PATTERN = r'^https://boxd\.it/[a-zA-Z0-9]{1,4}$'
+FIRST_FILM_YEAR = 1874
+
+def is_valid_uri(uri):
+    return bool(re.match(URI_PATTERN, uri))
+
+def is_valid_year(year):
+    return FIRST_FILM_YEAR <= year <= datetime.now().year + 1
+
 def validated_rating_input(message):
     valid = False
     rating = 0
@@ -134,75 +195,54 @@ def validated_year_input(message):
             valid = False
         
         if valid:
-            if 1874 <= year <= (current_year+1):
+            if is_valid_year(year):
                 return year
             else:
-                print(f"Year must be between 1874 and {current_year+1}.\n")
+                print(f"Year must be between {FIRST_FILM_YEAR} and {current_year+1}.\n")
                 valid = False
            
 
 def validated_uri_input(message):
-    pattern = r'^https://boxd\.it/[a-zA-Z0-9]{1,4}$'
-
     while True:
         print(message)
         uri = input()
 
-        if bool(re.match(pattern,uri)):
+        if is_valid_uri(uri):
             return uri
         else:
             print("Invalid URI.\n")
 
 
-def load_csv(filename):
-    movies = []
+def iter_movies(csvfile):
+    # Rows of a Letterboxd ratings.csv from any open text stream: a file on disk or a member of the export ZIP
+    reader = csv.reader(csvfile)
+    next(reader)  # Skip header
+    for row in reader:
+        yield Movie(*row)
+
+def iter_csv(filename):
     with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # Skip header
-        for row in reader:
-            movies.append(Movie(*row))
-    return movies
+        yield from iter_movies(csvfile)
+
+def load_csv(filename):
+    return list(iter_csv(filename))
 
 def save_csv(filename, movies):
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+    # Write beside the target and swap it in, so a crash never leaves a truncated ratings file
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(['Date', 'Name', 'Year', 'Letterboxd URI', 'Rating'])
         for movie in movies:
             writer.writerow([movie.date, movie.name, movie.year, movie.uri, movie.rating])
-
-def create_working_copy(original_file, working_file):
-    with open(original_file, 'r', encoding='utf-8') as original:
-        with open(working_file, 'w', encoding='utf-8') as working:
-            working.write(original.read())
+    os.replace(temp_filename, filename)
 
 def create_movie_bag(movies):
-    return deque(random.sample(movies, len(movies)))
+    return MovieBag(movies)
 
 def select_movies(bag, num_movies):
-    # Select up to num_movies, but not more than what's in the bag
-    num_to_select = min(num_movies, len(bag))
-    
-    selected = []
-    used_ratings = set()
-    temp_bag = []
-    
-    # First pass: select movies with unique ratings
-    while bag and len(selected) < num_to_select:
-        movie = bag.popleft()
-        if movie.rating not in used_ratings:
-            selected.append(movie)
-            used_ratings.add(movie.rating)
-        else:
-            temp_bag.append(movie)
-    
-    # Return unselected movies to the bag
-    bag.extend(temp_bag)
-    
-    # Second pass: fill remaining slots with any movies
-    while len(selected) < num_to_select and bag:
-        selected.append(bag.popleft())
-    
-    return selected
+    # Select up to num_movies with distinct ratings where possible, but not more than what's in the bag
+    return bag.draw(min(num_movies, len(bag)))
 
 def update_ratings(movies, ranking):
     # Sort the movies by their current ratings (highest to lowest)
@@ -216,13 +256,5 @@ def update_ratings(movies, ranking):
         movies[old_pos].rating = new_ratings[new_pos]
 
 def compare_csvs(original_file, working_file, diff_file):
-    original_movies = {(m.name, m.year): m for m in load_csv(original_file)}
-    working_movies = {(m.name, m.year): m for m in load_csv(working_file)}
-    
-    changed_movies = [
-        working_movies[(name, year)]
-        for (name, year) in original_movies
-        if original_movies[(name, year)].rating != working_movies[(name, year)].rating
-    ]
-    
-    save_csv(diff_file, changed_movies)
\ No newline at end of file
+    # Joined on Letterboxd URI, since title and year aren't unique
+    return compare_files(original_file, working_file, diff_file)
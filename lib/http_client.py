@@ -0,0 +1,101 @@
+import logging, random, threading, time
+from urllib.parse import urlsplit
+
+from lib.helper_functions import get_headers, get_requests
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class RateLimiter:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlsplit(url).hostname
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
+
+class HttpClient:
+    def __init__(self, pool_size=8, rate=2.0, burst=4, retries=4, backoff=1.0, timeout=20):
+        self.pool_size = pool_size
+        self.session = None
+        self.session_lock = threading.Lock()
+
+        self.limiter = RateLimiter(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # Set by close(), so workers still retrying give up rather than hold the process open
+        self.closed = threading.Event()
+
+    def get_session(self):
+        # Built on first use, so launching the app never imports requests when every poster is cached
+        with self.session_lock:
+            if self.session is None:
+                requests = get_requests()
+                from requests.adapters import HTTPAdapter
+                self.session = requests.Session()
+                self.session.headers.update(get_headers())
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                self.session.mount('http://', adapter)
+                self.session.mount('https://', adapter)
+            return self.session
+
+    def get(self, url, **kwargs):
+        requests = get_requests()
+        session = self.get_session()
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            if self.closed.is_set():
+                raise requests.ConnectionError(f"Not fetching {url}: the client is closed")
+            self.limiter.acquire(url)
+            try:
+                response = session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.get_delay(attempt)
+                logging.warning(f"{e.__class__.__name__} for {url}, retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                delay = self.get_delay(attempt, response.headers.get('Retry-After'))
+                logging.warning(f"Status {response.status_code} for {url}, retrying in {delay:.1f}s")
+                response.close()
+            self.closed.wait(delay)
+
+    def get_delay(self, attempt, retry_after=None):
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Exponential backoff with jitter so parallel workers don't retry in lockstep
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def close(self):
+        self.closed.set()
+        if self.session is not None:
+            self.session.close()
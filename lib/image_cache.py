@@ -0,0 +1,32 @@
+from collections import OrderedDict
+
+class PosterImageCache:
+    # LRU of ready-to-display PhotoImages keyed by (poster path, width, height)
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+    def get(self, path, width, height):
+        key = (path, width, height)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, path, width, height, photo):
+        key = (path, width, height)
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)[1]
+        # Tk keeps decoded images as 32-bit pixels
+        size = width * height * 4
+        self.entries[key] = (photo, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def invalidate(self, path):
+        for key in [key for key in self.entries if key[0] == path]:
+            self.total_bytes -= self.entries.pop(key)[1]
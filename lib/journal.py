@@ -0,0 +1,86 @@
+import csv, os
+
+class RatingJournal:
+    # Append-only log of rating changes, one "round,uri,old,new" row per changed movie
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.writer = None
+        # uri -> [rating before the session, latest rating]
+        self.net_changes = {}
+        self.last_round = 0
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def replay(self, movies):
+        movies_by_uri = {movie.uri: movie for movie in movies}
+        replayed = 0
+        with open(self.path, 'r', newline='', encoding='utf-8') as journal:
+            lines = journal.readlines()
+        if lines and not lines[-1].endswith('\n'):
+            lines.pop()  # Torn final row from a crash
+        for row in csv.reader(lines):
+            try:
+                round_id, uri, old_rating, new_rating = int(row[0]), row[1], float(row[2]), float(row[3])
+            except (ValueError, IndexError):
+                continue
+            self.track(uri, old_rating, new_rating)
+            self.last_round = max(self.last_round, round_id)
+            if uri in movies_by_uri:
+                movies_by_uri[uri].rating = new_rating
+                replayed += 1
+        return replayed
+
+    def open(self):
+        if os.path.exists(self.path):
+            # Drop a half-written final row so new rows don't get glued onto it
+            with open(self.path, 'rb+') as journal:
+                data = journal.read()
+                if data and not data.endswith(b'\n'):
+                    journal.truncate(data.rfind(b'\n') + 1)
+        self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+
+    def track(self, uri, old_rating, new_rating):
+        if uri in self.net_changes:
+            self.net_changes[uri][1] = new_rating
+        else:
+            self.net_changes[uri] = [old_rating, new_rating]
+
+    def append(self, round_id, changes):
+        for uri, old_rating, new_rating in changes:
+            self.writer.writerow([round_id, uri, old_rating, new_rating])
+            self.track(uri, old_rating, new_rating)
+        self.last_round = round_id
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def original_ratings(self):
+        return {uri: old_rating for uri, (old_rating, _) in self.net_changes.items()}
+
+    def compact(self):
+        # Collapse to one row per movie that is still changed, keeping the session's starting ratings
+        self.net_changes = {
+            uri: change for uri, change in self.net_changes.items() if change[0] != change[1]
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', newline='', encoding='utf-8') as journal:
+            writer = csv.writer(journal)
+            for uri, (old_rating, new_rating) in self.net_changes.items():
+                writer.writerow([self.last_round, uri, old_rating, new_rating])
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.close()
+        os.replace(temp_path, self.path)
+        self.open()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
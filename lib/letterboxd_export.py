@@ -0,0 +1,171 @@
+import csv, glob, hashlib, io, json, logging, os, shutil, zipfile
+from dataclasses import dataclass, field
+from typing import List
+
+from lib.engine import DEFAULT_RATINGS_FILE, session_paths
+from lib.helper_functions import Movie, iter_movies, save_csv
+from lib.ratings_diff import read_ratings_by_uri
+
+# letterboxd-<username>-<date>-utc.zip, as downloaded from letterboxd.com/settings/data/
+EXPORT_PATTERN = 'letterboxd-*.zip'
+EXPORT_MEMBERS = ('ratings.csv',)
+
+MERGE_REPORT_HEADER = ['Change', 'Name', 'Year', 'Letterboxd URI', 'Local Rating', 'Export Rating']
+
+@dataclass
+class ExportMerge:
+    # What a fresh export changes in the library, measured against the export imported before it
+    added: List[Movie] = field(default_factory=list)
+    removed: List[Movie] = field(default_factory=list)
+    # (movie, local rating, export rating)
+    rerated: list = field(default_factory=list)
+    conflicts: list = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.rerated or self.conflicts)
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.removed)} removed, {len(self.rerated)} re-rated on Letterboxd, "
+                f"{len(self.conflicts)} conflicts kept at their ranked rating")
+
+    def write_report(self, filename):
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(MERGE_REPORT_HEADER)
+            for movie in self.added:
+                writer.writerow(['added', movie.name, movie.year, movie.uri, '', movie.rating])
+            for movie in self.removed:
+                writer.writerow(['removed', movie.name, movie.year, movie.uri, movie.rating, ''])
+            for change, rows in (('re-rated', self.rerated), ('conflict', self.conflicts)):
+                for movie, local, exported in rows:
+                    writer.writerow([change, movie.name, movie.year, movie.uri, local, exported])
+        os.replace(temp_filename, filename)
+
+def find_export(directory):
+    # The newest export in the folder, if any
+    exports = glob.glob(os.path.join(directory, EXPORT_PATTERN))
+    return max(exports, key=os.path.getmtime) if exports else None
+
+def export_fingerprint(archive):
+    # Built from the ZIP's central directory (names, CRCs and sizes), so nothing is decompressed
+    digest = hashlib.md5()
+    for name in EXPORT_MEMBERS:
+        try:
+            info = archive.getinfo(name)
+        except KeyError:
+            continue
+        digest.update(f"{name}:{info.CRC:08x}:{info.file_size}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def open_member(archive, name):
+    # Decompressed as it's read rather than extracted to disk
+    return io.TextIOWrapper(archive.open(name), encoding='utf-8', newline='')
+
+def iter_export_movies(archive):
+    with open_member(archive, 'ratings.csv') as csvfile:
+        yield from iter_movies(csvfile)
+
+def read_export_rows(archive):
+    # uri -> raw CSV row; Movies are only built for films the library doesn't have yet
+    with open_member(archive, 'ratings.csv') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)  # Skip header
+        return {row[3]: row for row in reader}
+
+def save_export_base(archive, filename):
+    # The export's ratings.csv as it was, copied without parsing; the next merge diffs against it
+    temp_filename = f"{filename}.tmp"
+    with archive.open('ratings.csv') as source, open(temp_filename, 'wb') as target:
+        shutil.copyfileobj(source, target)
+    os.replace(temp_filename, filename)
+
+def read_export_base(filename):
+    try:
+        return read_ratings_by_uri(filename)
+    except OSError:
+        return None
+
+def diff_export(movies_by_uri, rows, base, skip=()):
+    # A three-way comparison per URI: the library, the fresh export, and the export before it (base).
+    # A rating that differs only on Letterboxd is taken; one that differs only locally is kept for
+    # the diff; one changed on both sides is a conflict. Without a base every difference is a conflict
+    merge = ExportMerge()
+    for uri, row in rows.items():
+        movie = movies_by_uri.get(uri)
+        if movie is None:
+            if uri not in skip:
+                merge.added.append(Movie(*row))
+            continue
+        exported = float(row[4])
+        if movie.rating == exported:
+            continue
+        previous = base.get(uri) if base is not None else None
+        if previous == movie.rating:
+            merge.rerated.append((movie, movie.rating, exported))
+        elif previous != exported:
+            merge.conflicts.append((movie, movie.rating, exported))
+    if base is not None:
+        # Only films that came from an earlier export can have been deleted from Letterboxd;
+        # anything else missing was added here (like a Mode 2 film) and hasn't been imported yet
+        merge.removed = [movies_by_uri[uri] for uri in base.keys() - rows.keys()
+                         if uri in movies_by_uri and uri not in skip]
+    return merge
+
+def read_cached_fingerprint(filename):
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f).get('fingerprint')
+    except (OSError, ValueError):
+        return None
+
+def save_cached_fingerprint(filename, export_file, fingerprint):
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as f:
+        json.dump({'export': os.path.basename(export_file), 'fingerprint': fingerprint}, f)
+    os.replace(temp_filename, filename)
+
+def import_export(export_file, ratings_file, engine=None):
+    # Streams ratings.csv out of the export ZIP. Without a ratings file it becomes the library;
+    # otherwise it's merged into the engine's loaded session once there is one. Returns the ExportMerge, or None if there was nothing to do
+    paths = session_paths(ratings_file)
+    with zipfile.ZipFile(export_file) as archive:
+        if 'ratings.csv' not in archive.namelist():
+            logging.error(f"{export_file} has no ratings.csv; is it a Letterboxd export?")
+            return None
+        fingerprint = export_fingerprint(archive)
+        if fingerprint == read_cached_fingerprint(paths['export']):
+            logging.info(f"{os.path.basename(export_file)} is unchanged since the last import")
+            return None
+
+        if engine is not None:
+            skip = {movie.uri for movie in engine.new_movies}
+            merge = diff_export(engine.movies_by_uri, read_export_rows(archive), read_export_base(paths['export_base']), skip)
+            engine.apply_export_merge(merge)
+            if merge:
+                merge.write_report(paths['merge_report'])
+            logging.info(f"Merged {os.path.basename(export_file)}: {merge.summary()}")
+        elif os.path.exists(ratings_file):
+            return None  # Merged once the session is loaded
+        else:
+            movies = list(iter_export_movies(archive))
+            save_csv(ratings_file, movies)
+            merge = ExportMerge(added=movies)
+            logging.info(f"Imported {len(movies)} ratings from {os.path.basename(export_file)}")
+        save_export_base(archive, paths['export_base'])
+    save_cached_fingerprint(paths['export'], export_file, fingerprint)
+    return merge
+
+def picks_up_folder_export(ratings_file):
+    # A ZIP dropped into the folder is merged into the library that was imported from an export
+    # (and starts the default library), not into every ratings file that happens to sit beside it
+    if os.path.exists(ratings_file):
+        return os.path.exists(session_paths(ratings_file)['export_base'])
+    return ratings_file == DEFAULT_RATINGS_FILE
+
+def import_latest_export(ratings_file, export_file=None, engine=None):
+    if export_file is None and picks_up_folder_export(ratings_file):
+        export_file = find_export(os.path.dirname(ratings_file) or '.')
+    if export_file is None:
+        return None
+    return import_export(export_file, ratings_file, engine)
@@ -0,0 +1,120 @@
+import random
+from collections import deque
+
+class MovieBag:
+    # Movies left in the current bag cycle, bucketed by rating so a round never scans the library
+    def __init__(self, movies=()):
+        self.buckets = {}
+        self.positions = {}
+        self.upcoming = deque()
+        self.upcoming_count = 0
+        # movie -> True if added, False if removed since the last take_changes(); None when untracked
+        self.changes = None
+        self.refilled = False
+        for movie in movies:
+            self.add(movie)
+
+    @classmethod
+    def restore(cls, movies, upcoming, **kwargs):
+        bag = cls(movies, **kwargs)
+        for group in upcoming:
+            bag.upcoming.append(group)
+            bag.upcoming_count += len(group)
+        return bag
+
+    def __len__(self):
+        return len(self.positions) + self.upcoming_count
+
+    def __contains__(self, movie):
+        return movie in self.positions or any(movie in group for group in self.upcoming)
+
+    def add(self, movie):
+        bucket = self.buckets.setdefault(movie.rating, [])
+        self.positions[movie] = (movie.rating, len(bucket))
+        bucket.append(movie)
+        if self.changes is not None:
+            self.changes[movie] = True
+
+    def remove(self, movie):
+        # Swap with the bucket's last movie so removal is O(1)
+        rating, index = self.positions.pop(movie)
+        if self.changes is not None:
+            self.changes[movie] = False
+        bucket = self.buckets[rating]
+        last = bucket.pop()
+        if last is not movie:
+            bucket[index] = last
+            self.positions[last] = (rating, index)
+
+    def discard(self, movie):
+        # Take a film out of the library's bag wherever it is, including rounds drawn ahead
+        if movie in self.positions:
+            self.remove(movie)
+            return
+        for group in self.upcoming:
+            if movie in group:
+                group.remove(movie)
+                self.upcoming_count -= 1
+                return
+
+    def pop_random(self, rating):
+        bucket = self.buckets[rating]
+        movie = bucket[random.randrange(len(bucket))]
+        self.remove(movie)
+        return movie
+
+    def draw_group(self, num_movies):
+        selected = []
+        # Distinct ratings first, each picked with weight proportional to how many movies are left
+        # at that rating -- the same odds as walking a shuffled deque for the first unseen ratings
+        available = {rating: len(bucket) for rating, bucket in self.buckets.items() if bucket}
+        while available and len(selected) < num_movies:
+            rating = random.choices(list(available), weights=list(available.values()))[0]
+            del available[rating]
+            selected.append(self.pop_random(rating))
+
+        # Fill remaining slots with any movies
+        while len(selected) < num_movies and self.positions:
+            ratings = [rating for rating, bucket in self.buckets.items() if bucket]
+            rating = random.choices(ratings, weights=[len(self.buckets[r]) for r in ratings])[0]
+            selected.append(self.pop_random(rating))
+        return selected
+
+    def draw(self, num_movies):
+        if self.upcoming:
+            group = self.upcoming.popleft()
+            self.upcoming_count -= len(group)
+            if len(group) == num_movies:
+                return group
+            for movie in group:
+                self.add(movie)
+        return self.draw_group(num_movies)
+
+    def peek(self, num_rounds, num_movies=5):
+        # Draw the next rounds ahead of time so their posters can be fetched before they're shown
+        while len(self.upcoming) < num_rounds and self.positions:
+            group = self.draw_group(num_movies)
+            self.upcoming.append(group)
+            self.upcoming_count += len(group)
+        return [movie for group in list(self.upcoming)[:num_rounds] for movie in group]
+
+    def refill(self, movies):
+        self.buckets.clear()
+        self.positions.clear()
+        self.upcoming.clear()
+        self.upcoming_count = 0
+        for movie in movies:
+            self.add(movie)
+        if self.changes is not None:
+            self.changes.clear()
+            self.refilled = True
+
+    def track_changes(self):
+        self.changes = {}
+
+    def take_changes(self):
+        # Membership changes since the last call, or refilled=True if the whole bag was replaced
+        refilled, changes = self.refilled, self.changes
+        self.refilled = False
+        self.changes = {}
+        return refilled, changes
@@ -0,0 +1,138 @@
+import bisect
+
+from lib.tournament import insertion_rounds, narrow_interval, spaced_pivots
+
+# Most films on each side of a boundary between two ratings in the tie-band round
+TIE_BAND_SIZE = 2
+
+class Placement:
+    # Finds a newly watched film's rating with a 5-ary search over the library sorted by rating:
+    # each round shows it with 4 films evenly spaced through the part of the order it could still
+    # belong in, so every round narrows that to a fifth and the rating is fixed in O(log n) rounds.
+    # The search stops as soon as only one rating, or the boundary between two neighbouring ones, is
+    # left; at a boundary, one tie-band round against films from both sides decides. Several
+    # placements can share a round, each bringing its own companions and learning from the others'
+    def __init__(self, movies, new_movie, lo=0, hi=None, band=None, rating=None, rounds=0, group_size=5):
+        # Worst to best; the URI orders films within a rating, so a resumed search sees the same index
+        self.index = sorted((movie for movie in movies if movie is not new_movie), key=lambda movie: (movie.rating, movie.uri))
+        self.keys = [(movie.rating, movie.uri) for movie in self.index]
+        self.ratings = [movie.rating for movie in self.index]
+        self.levels = sorted(set(self.ratings))
+        self.new_movie = new_movie
+        # The rating it was entered with breaks an even tie-band round
+        self.guess = new_movie.rating
+        self.lo = lo
+        self.hi = len(self.index) if hi is None else min(hi, len(self.index))
+        self.band = band  # (lower rating, higher rating) once the search lands between them
+        self.rating = rating  # Set once converged
+        self.rounds = rounds
+        self.group_size = group_size
+        self.previous = None
+        if self.rating is None and self.band is None:
+            self.settle()
+
+    def state(self):
+        return {'lo': self.lo, 'hi': self.hi, 'band': self.band, 'rating': self.rating, 'rounds': self.rounds}
+
+    @property
+    def converged(self):
+        return self.rating is not None
+
+    def position(self, movie):
+        # Where a library film sits in the index; None for another new film
+        i = bisect.bisect_left(self.keys, (movie.rating, movie.uri))
+        if i < len(self.index) and self.index[i] is movie:
+            return i
+        return None
+
+    def pivot_indices(self, count=None):
+        return spaced_pivots(self.lo, self.hi, count or self.group_size - 1)
+
+    def band_movies(self, count=None):
+        lower, higher = self.band
+        side = min(TIE_BAND_SIZE, max(1, (count or self.group_size - 1) // 2))
+        below = [movie for movie in self.index[max(0, self.lo - side):self.lo] if movie.rating == lower]
+        above = [movie for movie in self.index[self.lo:self.lo + side] if movie.rating == higher]
+        return below + above
+
+    def companions(self, count=None):
+        # The library films to show the new film with next
+        if self.band:
+            return self.band_movies(count)
+        return [self.index[i] for i in self.pivot_indices(count)]
+
+    def group(self):
+        if self.converged:
+            return None
+        return [self.new_movie] + self.companions()
+
+    def upcoming(self):
+        # Every film the next round could show, whichever way this one goes
+        if self.converged or self.band:
+            return []
+        pivots = self.pivot_indices()
+        movies = []
+        for below in range(len(pivots) + 1):
+            lo, hi = narrow_interval(self.lo, self.hi, pivots, below)
+            movies += [self.index[i] for i in spaced_pivots(lo, hi, self.group_size - 1)]
+        return movies
+
+    def submit(self, order):
+        # `order` is the shown round from best to worst. Other new films in it say nothing about this
+        # one, since their ratings are still open
+        self.previous = (self.lo, self.hi, self.band, self.rating)
+        self.rounds += 1
+        positions = [self.position(movie) for movie in order]
+        own = order.index(self.new_movie)
+        if self.band:
+            lower, higher = self.band
+            # Higher rated films it beat against lower rated ones it lost to; placed squarely between
+            # the two, its own guess decides
+            beaten = sum(movie.rating == higher for movie, i in zip(order[own + 1:], positions[own + 1:]) if i is not None)
+            lost_to = sum(movie.rating == lower for movie, i in zip(order[:own], positions[:own]) if i is not None)
+            if beaten == lost_to:
+                self.rating = min(self.band, key=lambda rating: (abs(rating - self.guess), rating))
+            else:
+                self.rating = higher if beaten > lost_to else lower
+            return
+        # Any library film inside the interval narrows it, not just this film's own pivots
+        inside = [i is not None and self.lo <= i < self.hi for i in positions]
+        pivots = sorted(i for i, usable in zip(positions, inside) if usable)
+        below = sum(inside[own + 1:])
+        self.lo, self.hi = narrow_interval(self.lo, self.hi, pivots, below)
+        self.settle()
+
+    def interval_ratings(self):
+        return self.ratings[max(self.lo - 1, 0)], self.ratings[min(self.hi, len(self.index) - 1)]
+
+    def settle(self):
+        # The film goes somewhere between index[lo - 1] and index[hi]. Where exactly only matters
+        # while another rating lies between those two; the order within a rating means nothing
+        if not self.index:
+            self.rating = self.guess
+            return
+        lower, higher = self.interval_ratings()
+        if lower == higher:
+            self.rating = lower
+        elif bisect.bisect_right(self.ratings, lower) == bisect.bisect_left(self.ratings, higher):
+            # Only the boundary between two neighbouring ratings is left
+            self.lo = self.hi = bisect.bisect_left(self.ratings, higher)
+            self.band = (lower, higher)
+
+    def undo(self):
+        if self.previous is None:
+            return False
+        self.lo, self.hi, self.band, self.rating = self.previous
+        self.previous = None
+        self.rounds -= 1
+        return True
+
+    def rounds_left(self):
+        if self.converged:
+            return 0
+        if self.band:
+            return 1
+        # Rounds to find the boundary between two neighbouring ratings, then the tie band
+        lower, higher = self.interval_ratings()
+        boundaries = self.levels.index(higher) - self.levels.index(lower)
+        return insertion_rounds(boundaries - 1, self.group_size) + 1
@@ -0,0 +1,67 @@
+import logging, queue, time
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.helper_functions import download_poster
+
+class PosterPrefetcher:
+    def __init__(self, master, poster_store, resolver, on_poster_ready, max_workers=4, poll_interval=50, round_timer=None):
+        self.master = master
+        self.round_timer = round_timer
+        self.poster_store = poster_store
+        self.resolver = resolver
+        self.on_poster_ready = on_poster_ready
+        self.poll_interval = poll_interval
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='poster')
+        # Workers never touch Tk; they hand results to the main loop through this queue
+        self.results = queue.Queue()
+        self.pending = set()
+        self.done = set()
+
+        self.poll_job = self.master.after(self.poll_interval, self.poll_results)
+
+    def prefetch(self, movies):
+        for movie in movies:
+            if movie.uri in self.pending or movie.uri in self.done or self.poster_store.is_fetched(movie.uri):
+                continue
+            self.pending.add(movie.uri)
+            self.executor.submit(self.fetch_poster, movie)
+
+    def fetch_poster(self, movie):
+        start = time.perf_counter()
+        fetched = False
+        try:
+            logging.info(f"Fetching poster for {movie.name}")
+            poster_url = self.resolver.resolve(movie.uri)
+            if poster_url:
+                fetched = download_poster(poster_url, movie.image_path, session=self.resolver.session)
+                if fetched:
+                    self.poster_store.record_fetched(movie.uri, movie.image_path)
+                    logging.info(f"Successfully downloaded poster for {movie.name}")
+                else:
+                    self.poster_store.record_failed(movie.uri, movie.image_path, 'download_failed')
+                    logging.error(f"Failed to download poster for {movie.name}")
+            else:
+                self.poster_store.record_failed(movie.uri, movie.image_path, 'not_found')
+                logging.error(f"Poster not found for {movie.name}")
+        except Exception as e:
+            logging.error(f"Error fetching poster for {movie.name}: {e}")
+        self.results.put((movie, fetched, time.perf_counter() - start))
+
+    def poll_results(self):
+        while True:
+            try:
+                movie, fetched, elapsed = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if self.round_timer:
+                self.round_timer.record('poster_fetch (background)', elapsed)
+            self.pending.discard(movie.uri)
+            self.done.add(movie.uri)
+            if fetched:
+                self.on_poster_ready(movie)
+        self.poll_job = self.master.after(self.poll_interval, self.poll_results)
+
+    def shutdown(self):
+        self.master.after_cancel(self.poll_job)
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,82 @@
+import logging, sqlite3, threading, time
+
+from lib.helper_functions import get_tmdb_url, get_og_image_url
+from lib.poster_store import POSTER_DB_FILE
+
+RESOLVED = 'resolved'
+NOT_FOUND = 'not_found'
+
+# Poster URLs occasionally change on TMDB, so resolved entries are refreshed after a while
+RESOLVED_TTL = 30 * 24 * 60 * 60
+# Films with no TMDB link are retried after 6 hours, doubling up to a month
+NOT_FOUND_BACKOFF = 6 * 60 * 60
+NOT_FOUND_MAX_BACKOFF = 30 * 24 * 60 * 60
+
+class PosterResolver:
+    # Letterboxd URI -> TMDB page -> poster URL, cached on disk between sessions
+    def __init__(self, session, db_file=POSTER_DB_FILE):
+        self.session = session
+        self.db = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS resolutions (
+                    uri TEXT PRIMARY KEY,
+                    tmdb_url TEXT,
+                    poster_url TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    checked REAL NOT NULL,
+                    retry_after REAL
+                )''')
+
+    def get_entry(self, uri):
+        with self.lock:
+            return self.db.execute(
+                'SELECT tmdb_url, poster_url, status, attempts, checked, retry_after FROM resolutions WHERE uri = ?',
+                (uri,)
+            ).fetchone()
+
+    def save_entry(self, uri, tmdb_url, poster_url, status, attempts, retry_after=None):
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO resolutions (uri, tmdb_url, poster_url, status, attempts, checked, retry_after) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (uri, tmdb_url, poster_url, status, attempts, time.time(), retry_after)
+            )
+
+    def save_not_found(self, uri, tmdb_url, attempts):
+        backoff = min(NOT_FOUND_BACKOFF * 2 ** attempts, NOT_FOUND_MAX_BACKOFF)
+        self.save_entry(uri, tmdb_url, None, NOT_FOUND, attempts + 1, time.time() + backoff)
+
+    def resolve(self, uri, retry_not_found=False):
+        tmdb_url = None
+        attempts = 0
+        entry = self.get_entry(uri)
+        if entry:
+            tmdb_url, poster_url, status, previous_attempts, checked, retry_after = entry
+            if status == RESOLVED and time.time() - checked < RESOLVED_TTL:
+                return poster_url
+            if status == NOT_FOUND:
+                if time.time() < retry_after and not retry_not_found:
+                    logging.info(f"Skipping {uri}, no poster found last time")
+                    return None
+                attempts = previous_attempts
+
+        # The Letterboxd -> TMDB link never changes, so only the TMDB page is re-read on refresh
+        if not tmdb_url:
+            tmdb_url = get_tmdb_url(uri, self.session)
+            if not tmdb_url:
+                self.save_not_found(uri, None, attempts)
+                return None
+
+        poster_url = get_og_image_url(tmdb_url, self.session)
+        if not poster_url:
+            self.save_not_found(uri, tmdb_url, attempts)
+            return None
+
+        self.save_entry(uri, tmdb_url, poster_url, RESOLVED, 0)
+        return poster_url
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,147 @@
+import logging, os, re, sqlite3, threading, time
+
+from lib.helper_functions import get_file_md5
+from lib.thumbnails import thumbnail_path, pick_thumbnail_height
+
+NO_IMAGE_FILE = './assets/no_image.jpg'
+POSTER_DB_FILE = './db/posters.sqlite3'
+IMAGES_DIR = './images'
+
+MISSING = 'missing'
+FETCHED = 'fetched'
+FAILED = 'failed'
+
+POSTER_FILENAME_PATTERN = re.compile(r'\(([A-Za-z0-9]+)\)\.jpg$')
+
+def get_image_size(path):
+    # Pillow only reads the header here, but it's optional for the scraper
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, None
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except OSError:
+        return None, None
+
+class PosterStore:
+    def __init__(self, db_file=POSTER_DB_FILE, images_dir=IMAGES_DIR):
+        self.db = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS posters (
+                    uri TEXT PRIMARY KEY,
+                    path TEXT,
+                    status TEXT NOT NULL,
+                    hash TEXT,
+                    width INTEGER,
+                    height INTEGER,
+                    error TEXT,
+                    updated REAL
+                )''')
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            columns = {row[1] for row in self.db.execute('PRAGMA table_info(posters)')}
+            if 'thumbnails' not in columns:
+                # Comma-separated heights of the pre-rendered thumbnails
+                self.db.execute('ALTER TABLE posters ADD COLUMN thumbnails TEXT')
+
+        # The whole index is a few bytes per movie, so "is this a real poster" never touches disk
+        self.statuses = dict(self.db.execute('SELECT uri, status FROM posters'))
+        self.thumbnails = {
+            uri: tuple(int(height) for height in heights.split(','))
+            for uri, heights in self.db.execute("SELECT uri, thumbnails FROM posters WHERE thumbnails != ''")
+        }
+        self.no_image_hash = get_file_md5(NO_IMAGE_FILE)
+
+        if self.get_meta('images_indexed') is None:
+            self.index_images_dir(images_dir)
+
+    def get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def status(self, uri):
+        return self.statuses.get(uri, MISSING)
+
+    def is_fetched(self, uri):
+        return self.statuses.get(uri) == FETCHED
+
+    def get_error(self, uri):
+        row = self.db.execute('SELECT error FROM posters WHERE uri = ?', (uri,)).fetchone()
+        return row[0] if row else None
+
+    def display_path(self, movie):
+        return movie.image_path if self.is_fetched(movie.uri) else NO_IMAGE_FILE
+
+    def save(self, uri, path, status, file_hash=None, width=None, height=None, error=None):
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO posters (uri, path, status, hash, width, height, error, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (uri, path, status, file_hash, width, height, error, time.time())
+            )
+        self.statuses[uri] = status
+        # A replaced row starts without thumbnails, so stale ones are never shown
+        self.thumbnails.pop(uri, None)
+
+    def record_fetched(self, uri, path):
+        width, height = get_image_size(path)
+        self.save(uri, path, FETCHED, get_file_md5(path), width, height)
+
+    def record_failed(self, uri, path, error):
+        self.save(uri, path, FAILED, error=error)
+
+    def mark_missing(self, uri, path):
+        self.save(uri, path, MISSING)
+
+    def thumbnail_heights(self, uri):
+        return self.thumbnails.get(uri, ())
+
+    def thumbnail_for(self, movie, height):
+        # Path of the pre-rendered thumbnail to scale down for a slot this tall, or None to use the original
+        if not self.is_fetched(movie.uri):
+            return None
+        thumb_height = pick_thumbnail_height(self.thumbnail_heights(movie.uri), height)
+        return thumbnail_path(movie.uri, thumb_height) if thumb_height else None
+
+    def record_thumbnails(self, uri, heights):
+        with self.lock, self.db:
+            self.db.execute(
+                'UPDATE posters SET thumbnails = ? WHERE uri = ?', (','.join(map(str, heights)), uri)
+            )
+        if heights:
+            self.thumbnails[uri] = tuple(heights)
+
+    def fetched_without_thumbnails(self):
+        return self.db.execute(
+            'SELECT uri, path FROM posters WHERE status = ? AND thumbnails IS NULL', (FETCHED,)
+        ).fetchall()
+
+    def index_images_dir(self, images_dir):
+        # One-time migration from the old layout, where every poster-less movie got a copy of no_image.jpg
+        logging.info(f"Indexing posters in {images_dir}")
+        no_image_size = os.path.getsize(NO_IMAGE_FILE)
+        indexed = removed = 0
+        if os.path.isdir(images_dir):
+            for entry in os.scandir(images_dir):
+                match = POSTER_FILENAME_PATTERN.search(entry.name)
+                if not match or not entry.is_file():
+                    continue
+                path = os.path.join(images_dir, entry.name)
+                if entry.stat().st_size == no_image_size and get_file_md5(path) == self.no_image_hash:
+                    os.remove(path)
+                    removed += 1
+                    continue
+                self.record_fetched(f'https://boxd.it/{match.group(1)}', path)
+                indexed += 1
+        self.set_meta('images_indexed', str(time.time()))
+        logging.info(f"Indexed {indexed} posters, removed {removed} placeholder copies")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,66 @@
+import functools, json, time
+from collections import deque
+from contextlib import contextmanager
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+class RoundTimer:
+    # Per-stage wall time for the last `capacity` rounds
+    def __init__(self, capacity=1000):
+        self.rounds = deque(maxlen=capacity)
+        self.current = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def end_round(self):
+        if self.current:
+            self.rounds.append(self.current)
+            self.current = {}
+
+    def summary(self):
+        samples = {}
+        for round_timings in self.rounds:
+            for name, seconds in round_timings.items():
+                samples.setdefault(name, []).append(seconds * 1000)
+        summary = {}
+        for name, values in sorted(samples.items()):
+            values.sort()
+            summary[name] = {
+                'rounds': len(values),
+                'p50_ms': percentile(values, 0.50),
+                'p95_ms': percentile(values, 0.95),
+                'max_ms': values[-1],
+            }
+        return summary
+
+    def format_summary(self):
+        lines = [f"{'stage':<32} {'rounds':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+        for name, stats in self.summary().items():
+            lines.append(
+                f"{name:<32} {stats['rounds']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['max_ms']:>9.2f}"
+            )
+        return '\n'.join(lines)
+
+    def dump(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(), 'rounds': list(self.rounds)}, f, indent=2)
+
+def timed(stage):
+    # Times a method into self.round_timer; stages nest, so a parent's time includes its children's
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.round_timer.stage(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
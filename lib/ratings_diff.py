@@ -0,0 +1,77 @@
+import csv, os
+
+DIFF_HEADER = ['Date', 'Name', 'Year', 'Letterboxd URI', 'Rating']
+
+def read_ratings_by_uri(filename):
+    # Just uri -> rating; no Movie objects needed to diff
+    with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)  # Skip header
+        return {row[3]: float(row[4]) for row in reader}
+
+class RatingsDiff:
+    # Baseline ratings from the start of the session, keyed by Letterboxd URI. Only movies marked
+    # since then are compared on export, so writing changed_ratings.csv costs O(changed)
+    def __init__(self, baseline=None):
+        self.baseline = baseline if baseline is not None else {}
+        # Used as an ordered set, so the diff lists movies in the order they were first changed
+        self.dirty = {}
+
+    @classmethod
+    def from_movies(cls, movies):
+        return cls({movie.uri: movie.rating for movie in movies})
+
+    def set_baseline(self, uri, rating):
+        self.baseline[uri] = rating
+
+    def mark(self, uri):
+        self.dirty[uri] = None
+
+    def forget(self, uri):
+        # Deleted on Letterboxd itself, so there's nothing left to export
+        self.baseline.pop(uri, None)
+        self.dirty.pop(uri, None)
+
+    def changed(self, movies_by_uri):
+        for uri in self.dirty:
+            movie = movies_by_uri.get(uri)
+            if movie is not None and movie.rating != self.baseline.get(uri):
+                yield movie
+
+    def export(self, diff_file, movies_by_uri):
+        temp_file = f"{diff_file}.tmp"
+        count = 0
+        with open(temp_file, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(DIFF_HEADER)
+            for movie in self.changed(movies_by_uri):
+                writer.writerow([movie.date, movie.name, movie.year, movie.uri, movie.rating])
+                count += 1
+        os.replace(temp_file, diff_file)
+        return count
+
+def compare_files(original_file, working_file, diff_file):
+    # Streams the working file once against the original's ratings and writes changed or added rows as it goes
+    baseline = read_ratings_by_uri(original_file)
+    seen = set()
+    changed = added = 0
+    temp_file = f"{diff_file}.tmp"
+    with open(working_file, 'r', newline='', encoding='utf-8') as working, \
+            open(temp_file, 'w', newline='', encoding='utf-8') as diff:
+        reader = csv.reader(working)
+        writer = csv.writer(diff)
+        next(reader)  # Skip header
+        writer.writerow(DIFF_HEADER)
+        for row in reader:
+            uri = row[3]
+            seen.add(uri)
+            if uri not in baseline:
+                added += 1
+            elif float(row[4]) == baseline[uri]:
+                continue
+            else:
+                changed += 1
+            writer.writerow(row)
+    os.replace(temp_file, diff_file)
+    removed = len(baseline.keys() - seen)
+    return {'changed': changed, 'added': added, 'removed': removed}
@@ -0,0 +1,61 @@
+import logging, os, tempfile, time
+
+from lib.comparison_graph import write_comparisons
+from lib.engine import RankingEngine, read_transcript, ratings_digest, session_paths
+from lib.helper_functions import Movie, save_csv
+
+def replay_transcript(path):
+    # Runs a recorded session through the engine as fast as it will go, against a scratch copy of
+    # the library it started from, so the journal, checkpoints and snapshots all do real I/O
+    header, events = read_transcript(path)
+    if header.get('resumed'):
+        logging.warning("This transcript continues a resumed session, so its rounds won't be drawn the same way")
+
+    rounds = undos = diverged = 0
+    expected = None
+    with tempfile.TemporaryDirectory() as workdir:
+        ratings_file = os.path.join(workdir, 'ratings.csv')
+        save_csv(ratings_file, [Movie(*row) for row in header['library']])
+        write_comparisons(session_paths(ratings_file)['comparisons'], header.get('comparisons', []))
+        # Transcripts from before batches held a single 'new_movie'
+        rows = header.get('new_movies') or ([header['new_movie']] if header.get('new_movie') else [])
+        new_movies = [Movie(*row) for row in rows]
+
+        start = time.perf_counter()
+        # Transcripts from before active selection drew their rounds at random
+        engine = RankingEngine(header['mode'], new_movies, ratings_file, seed=header['seed'],
+                               selection=header.get('selection', 'random'))
+        engine.start()
+        for event in events:
+            if 'order' in event:
+                shown = [movie.uri for movie in engine.state.selected_movies]
+                if set(shown) != set(event['group']):
+                    if engine.tournament or engine.placements:
+                        raise ValueError(f"Round {rounds + 1} was drawn differently from the recording")
+                    # Put the recorded round up instead, so one difference doesn't derail the rest
+                    diverged += 1
+                    engine.force_round(event['group'])
+                    shown = [movie.uri for movie in engine.state.selected_movies]
+                engine.round_timer.end_round()
+                engine.submit([shown.index(uri) for uri in event['order']])
+                rounds += 1
+            elif 'undo' in event:
+                engine.undo()
+                undos += 1
+            elif 'final' in event:
+                expected = event['final']
+        engine.close()
+        seconds = time.perf_counter() - start
+
+    engine.round_timer.end_round()
+    final = ratings_digest(engine.all_movies())
+    result = {
+        'rounds': rounds,
+        'undos': undos,
+        'diverged': diverged,
+        'seconds': seconds,
+        'rounds_per_s': rounds / seconds if seconds else 0.0,
+        'final': final,
+        'matches': expected is None or final == expected,
+    }
+    return result, engine.round_timer
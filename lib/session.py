@@ -0,0 +1,87 @@
+import array, hashlib, os, pickle, struct
+
+# Every record is a pickled dict behind its length
+RECORD_LENGTH = struct.Struct('<I')
+
+def library_fingerprint(movies):
+    # Snapshots refer to films by their index in ratings.csv, so they only apply to the same list of films
+    digest = hashlib.md5()
+    for movie in movies:
+        digest.update(movie.uri.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+def pack_indices(indices):
+    return array.array('i', indices).tobytes()
+
+def unpack_indices(data):
+    indices = array.array('i')
+    indices.frombytes(data)
+    return indices
+
+class SessionSnapshot:
+    # A base record with the whole session, followed by one small delta record per round.
+    # The base is rewritten now and then, so restoring never replays more than a few deltas
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        # Deltas since the base record; None until this run has written one
+        self.deltas = None
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def read_records(self):
+        records = []
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + RECORD_LENGTH.size <= len(data):
+            (length,) = RECORD_LENGTH.unpack_from(data, offset)
+            start = offset + RECORD_LENGTH.size
+            if start + length > len(data):
+                break  # Torn final record from a crash
+            try:
+                records.append(pickle.loads(data[start:start + length]))
+            except (pickle.UnpicklingError, EOFError, ValueError):
+                break
+            offset = start + length
+        return records
+
+    def read_base(self):
+        try:
+            records = self.read_records()
+        except OSError:
+            return None
+        return records[0] if records else None
+
+    def write_record(self, f, record):
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        f.write(RECORD_LENGTH.pack(len(data)))
+        f.write(data)
+
+    def write_base(self, base):
+        self.close()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            self.write_record(f, base)
+        os.replace(temp_path, self.path)
+        self.file = open(self.path, 'ab')
+        self.deltas = 0
+
+    def append(self, delta):
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        self.write_record(self.file, delta)
+        self.file.flush()
+        self.deltas += 1
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,61 @@
+from lib.engine import Frontend, parse_ranking
+from lib.letterboxd_export import import_latest_export
+
+PROMPT = "Ranking, best to worst (Enter keeps this order, u = undo, s = export changes, r = merge a new export, q = quit): "
+
+class TerminalFrontend(Frontend):
+    # Plain stdin/stdout rounds: no display, Tk or Pillow, so it starts quickly and works over SSH
+    def show_round(self):
+        state = self.engine.state
+        progress = self.engine.progress()
+        if progress:
+            print(progress)
+        if not state.selected_movies:
+            return
+        print()
+        for i, movie in enumerate(state.selected_movies, 1):
+            print(f"  {i}. {movie.name} ({movie.year})  Rating: {movie.rating}")
+        print(f"Bag Cycles: {state.bag_cycle_count}  Total Ranked: {state.total_ranked_count}  Movies in Bag: {state.movies_in_bag}  Already Known: {state.rounds_skipped}")
+
+    def show_message(self, message):
+        print(message)
+
+    def run(self):
+        self.engine.start()
+        self.show_round()
+
+        while self.engine.state.selected_movies:
+            try:
+                command = input(PROMPT).strip().lower()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
+            if command == 'q':
+                break
+            if command == 'u':
+                if self.engine.undo():
+                    self.show_round()
+                else:
+                    self.show_message("Cannot Undo!")
+            elif command == 's':
+                count = self.engine.export_diff()
+                self.show_message(f"{count} changed ratings exported to {self.engine.diff_file}")
+            elif command == 'r':
+                merge = import_latest_export(self.engine.original_file, engine=self.engine)
+                if merge is None:
+                    self.show_message("No new Letterboxd export to merge")
+                else:
+                    self.show_message(f"Letterboxd export merged: {merge.summary()}")
+                    self.show_round()
+            else:
+                num_movies = len(self.engine.state.selected_movies)
+                ranking = parse_ranking(command, num_movies)
+                if ranking is None:
+                    self.show_message(f"Enter each number from 1 to {num_movies} once.")
+                    continue
+                self.engine.round_timer.end_round()
+                self.engine.submit(ranking)
+                self.show_round()
+
+        self.engine.close()
+        self.show_message(f"Changes saved to {self.engine.diff_file}")
@@ -0,0 +1,71 @@
+import logging, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+
+THUMBNAILS_DIR = './images/thumbnails'
+# Poster heights in pixels; the layout keeps posters at 2:3, so widths follow from these
+THUMBNAIL_HEIGHTS = (270, 360, 480, 640)
+
+def thumbnail_path(uri, height):
+    return os.path.join(THUMBNAILS_DIR, f"{uri.split('/')[-1]}.{height}.jpg")
+
+def pick_thumbnail_height(heights, target_height):
+    # Smallest thumbnail at least as tall as the slot, so the final resize is always a small downscale
+    for height in sorted(heights):
+        if height >= target_height:
+            return height
+    return None
+
+def render_thumbnails(uri, image_path, heights=THUMBNAIL_HEIGHTS):
+    # Runs in a worker process
+    from PIL import Image
+    os.makedirs(THUMBNAILS_DIR, exist_ok=True)
+    rendered = []
+    with Image.open(image_path) as img:
+        # Let the JPEG decoder drop resolution while decoding, down to what the largest thumbnail needs
+        img.draft('RGB', (round(max(heights) / 1.5), max(heights)))
+        img = img.convert('RGB')
+        for height in heights:
+            if height > img.height:
+                continue  # Never upscale; the original is used for slots this big
+            path = thumbnail_path(uri, height)
+            img.resize((round(height / 1.5), height), Image.LANCZOS).save(f"{path}.part", 'JPEG', quality=90)
+            os.replace(f"{path}.part", path)
+            rendered.append(height)
+    return rendered
+
+class ThumbnailGenerator:
+    def __init__(self, poster_store, max_workers=None):
+        self.poster_store = poster_store
+        # Leave a core free for the GUI
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.executor = None
+        self.pending = set()
+
+    def submit(self, uri, image_path):
+        if uri in self.pending or not self.poster_store.is_fetched(uri) or self.poster_store.thumbnail_heights(uri):
+            return
+        if self.executor is None:
+            # Spawned, not forked: a fork taken while a poster thread holds the import or logging lock
+            # would leave the child waiting on it forever
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        self.pending.add(uri)
+        future = self.executor.submit(render_thumbnails, uri, image_path)
+        future.add_done_callback(lambda future: self.on_rendered(uri, future))
+
+    def submit_missing(self):
+        for uri, image_path in self.poster_store.fetched_without_thumbnails():
+            self.submit(uri, image_path)
+
+    def on_rendered(self, uri, future):
+        self.pending.discard(uri)
+        if future.cancelled():
+            return
+        try:
+            self.poster_store.record_thumbnails(uri, future.result())
+        except Exception as e:
+            logging.error(f"Could not render thumbnails for {uri}: {e}")
+
+    def shutdown(self, wait=False):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=not wait)
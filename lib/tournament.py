@@ -0,0 +1,176 @@
+import json, os, random
+
+def insertion_rounds(size, group_size=5):
+    # Rounds to place one film among `size` ranked ones: each round cuts the candidate slots by group_size
+    rounds, reach = 0, 1
+    while reach < size + 1:
+        reach *= group_size
+        rounds += 1
+    return rounds
+
+def spaced_pivots(lo, hi, count):
+    # Up to `count` positions evenly spaced through [lo, hi), splitting its insertion slots as evenly as possible
+    size = hi - lo
+    count = min(count, size)
+    return [lo + (i + 1) * (size + 1) // (count + 1) - 1 for i in range(count)]
+
+def narrow_interval(lo, hi, pivots, below):
+    # The part of [lo, hi) left once `below` of the pivots (the lowest ones) were ranked under the film
+    if below > 0:
+        lo = pivots[below - 1] + 1
+    if below < len(pivots):
+        hi = pivots[below]
+    return lo, hi
+
+class TournamentSort:
+    # Sorts the whole library with 5-way rankings. Films are inserted one at a time into a ranked list;
+    # each round shows the film being placed with 4 evenly spaced films from its remaining interval,
+    # so every round narrows the insertion point to a fifth (a 5-ary binary insertion sort)
+    def __init__(self, ranked, unplaced, current=None, lo=0, hi=0, rounds=0, group_size=5):
+        self.ranked = ranked  # Worst to best
+        self.unplaced = unplaced  # Taken from the end
+        self.current = current
+        self.lo = lo
+        self.hi = hi
+        self.rounds = rounds
+        self.group_size = group_size
+        self.previous = None
+        self.start_next()
+
+    @classmethod
+    def start(cls, uris):
+        unplaced = list(uris)
+        random.shuffle(unplaced)
+        return cls([], unplaced)
+
+    @classmethod
+    def load(cls, filename, uris):
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # Reconcile with the library: films removed since are dropped, new ones join the queue
+        library = set(uris)
+        ranked = [uri for uri in data['ranked'] if uri in library]
+        current = data['current'] if data['current'] in library else None
+        known = set(ranked) | {current}
+        unplaced = [uri for uri in data['unplaced'] if uri in library and uri not in known]
+        known.update(unplaced)
+        unplaced = [uri for uri in uris if uri not in known] + unplaced
+        lo, hi = data['lo'], data['hi']
+        if len(ranked) != len(data['ranked']):
+            lo, hi = 0, len(ranked)  # Positions shifted; search the current film's place again
+        return cls(ranked, unplaced, current, lo, hi, data['rounds'])
+
+    def save(self, filename):
+        temp_file = f"{filename}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'ranked': self.ranked,
+                'unplaced': self.unplaced,
+                'current': self.current,
+                'lo': self.lo,
+                'hi': self.hi,
+                'rounds': self.rounds,
+            }, f)
+        os.replace(temp_file, filename)
+
+    def start_next(self):
+        if self.current is None and self.ranked and self.unplaced:
+            self.current = self.unplaced.pop()
+            self.lo, self.hi = 0, len(self.ranked)
+
+    def add(self, uri):
+        # Joins the queue like a film found by load(): placed after everything already waiting
+        self.unplaced.insert(0, uri)
+        self.start_next()
+
+    def discard(self, uri):
+        self.previous = None
+        if uri == self.current:
+            self.current = None
+        elif uri in self.unplaced:
+            self.unplaced.remove(uri)
+        elif uri in self.ranked:
+            index = self.ranked.index(uri)
+            del self.ranked[index]
+            # Keep the search interval on the same films
+            if index < self.lo:
+                self.lo -= 1
+            if index < self.hi:
+                self.hi -= 1
+            if self.current is not None and self.lo >= self.hi:
+                self.ranked.insert(self.lo, self.current)
+                self.current = None
+        self.start_next()
+
+    def is_finished(self):
+        return self.current is None and not self.unplaced
+
+    def pivot_indices(self):
+        return spaced_pivots(self.lo, self.hi, self.group_size - 1)
+
+    def group(self):
+        if self.is_finished():
+            return None
+        if not self.ranked:
+            # The first round just ranks a full group, which seeds the ranked list
+            return self.unplaced[-self.group_size:]
+        return [self.current] + [self.ranked[i] for i in self.pivot_indices()]
+
+    def upcoming(self, count):
+        return self.unplaced[-count:]
+
+    def submit(self, order):
+        # `order` is the shown group from best to worst
+        self.previous = (self.ranked.copy(), self.unplaced.copy(), self.current, self.lo, self.hi)
+        self.rounds += 1
+        if not self.ranked:
+            self.ranked = order[::-1]
+            del self.unplaced[-len(order):]
+        else:
+            # Pivots ranked below the current film; trusted over their stored order if the two disagree
+            below = len(order) - 1 - order.index(self.current)
+            self.lo, self.hi = narrow_interval(self.lo, self.hi, self.pivot_indices(), below)
+            if self.lo >= self.hi:
+                self.ranked.insert(self.lo, self.current)
+                self.current = None
+        self.start_next()
+
+    def undo(self):
+        if self.previous is None:
+            return False
+        self.ranked, self.unplaced, self.current, self.lo, self.hi = self.previous
+        self.previous = None
+        self.rounds -= 1
+        return True
+
+    def progress(self):
+        placed = len(self.ranked)
+        return placed, placed + len(self.unplaced) + (self.current is not None)
+
+    def rounds_left(self):
+        if self.is_finished():
+            return 0
+        if not self.ranked:
+            size, count, rounds = min(self.group_size, len(self.unplaced)), len(self.unplaced) - self.group_size, 1
+        else:
+            size, count = len(self.ranked) + 1, len(self.unplaced)
+            rounds = insertion_rounds(self.hi - self.lo, self.group_size)
+        # Every insertion into a list of the same size band costs the same, so add them up a band at a time
+        while count > 0:
+            band_rounds = insertion_rounds(size, self.group_size)
+            span = min(count, self.group_size ** band_rounds - size)
+            rounds += band_rounds * span
+            size += span
+            count -= span
+        return rounds
+
+def redistribute_ratings(movies):
+    # Hands the library's own ratings back out along the final order (worst to best), so the
+    # rating histogram is unchanged, just as update_ratings keeps each group's ratings
+    ratings = sorted(movie.rating for movie in movies)
+    changes = []
+    for movie, rating in zip(movies, ratings):
+        if movie.rating != rating:
+            changes.append((movie.uri, movie.rating, rating))
+            movie.rating = rating
+    return changes
@@ -0,0 +1,410 @@
+import asyncio, csv, json, logging, os, re, signal
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+from lib.engine import RankingEngine, Frontend, session_paths
+from lib.http_client import HttpClient
+from lib.letterboxd_export import import_latest_export
+from lib.poster_prefetch import PosterPrefetcher
+from lib.poster_resolver import PosterResolver
+from lib.poster_store import PosterStore
+from lib.ratings_diff import DIFF_HEADER
+from lib.session import SessionSnapshot
+from lib.thumbnails import ThumbnailGenerator
+
+POSTER_LOOKAHEAD_ROUNDS = 3
+# Fetched posters never change under the same URL and size; the placeholder is replaced once one arrives
+POSTER_MAX_AGE = 7 * 24 * 3600
+MAX_BODY_BYTES = 64 * 1024
+SESSION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+class LoopScheduler:
+    # The two Tk calls PosterPrefetcher schedules its polling with, on an asyncio loop
+    def __init__(self, loop):
+        self.loop = loop
+
+    def after(self, ms, callback):
+        return self.loop.call_later(ms / 1000, callback)
+
+    def after_cancel(self, handle):
+        handle.cancel()
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class WebSession:
+    # One ratings file's engine; requests for it take turns, and engine calls run off the event loop
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.lock = asyncio.Lock()
+
+def saved_session_mode(ratings_file):
+    session = SessionSnapshot(session_paths(ratings_file)['session'])
+    base = session.read_base() if session.exists() else None
+    return base['mode'] if base else None
+
+def session_ratings_file(ratings_dir, name):
+    # The ratings file session `name` ranks, or None. Merge reports and the like sit beside the ratings
+    # files, and changed_*.csv diffs even share their header, so neither makes a session
+    if not SESSION_NAME_PATTERN.match(name) or name.startswith('changed_'):
+        return None
+    ratings_file = os.path.join(ratings_dir, f'{name}.csv')
+    try:
+        with open(ratings_file, 'r', newline='', encoding='utf-8') as csvfile:
+            header = next(csv.reader(csvfile), None)
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return None
+    return ratings_file if header == DIFF_HEADER else None
+
+class WebFrontend(Frontend):
+    # Serves rounds as JSON and posters from ./images over plain HTTP, for ranking from a browser on the LAN.
+    # Every ratings file in the ratings directory is its own session: /api/<name>/... ranks db/<name>.csv
+    def __init__(self, ratings_file, mode="1", host='127.0.0.1', port=8080, selection='active'):
+        super().__init__(None)
+        self.ratings_dir = os.path.dirname(ratings_file) or '.'
+        self.default_session = os.path.splitext(os.path.basename(ratings_file))[0]
+        self.mode = mode
+        self.selection = selection
+        self.host = host
+        self.port = port
+        self.sessions = {}
+        self.sessions_lock = None
+
+    def show_round(self):
+        pass  # Browsers ask for rounds; nothing is pushed
+
+    def show_message(self, message):
+        logging.info(message)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.sessions_lock = asyncio.Lock()
+        self.poster_store = PosterStore()
+        self.http_client = HttpClient(pool_size=4)
+        self.resolver = PosterResolver(self.http_client)
+        self.thumbnailer = ThumbnailGenerator(self.poster_store)
+        self.prefetcher = PosterPrefetcher(LoopScheduler(loop), self.poster_store, self.resolver, self.on_poster_ready)
+        self.thumbnailer.submit_missing()
+
+        # Stop cleanly on Ctrl+C or a service manager's SIGTERM, so every session gets saved
+        task = asyncio.current_task()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, task.cancel)
+            except NotImplementedError:
+                pass  # Windows; Ctrl+C still raises KeyboardInterrupt
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        logging.info(f"Serving on http://{self.host}:{self.port}/ (Ctrl+C to stop)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for session in self.sessions.values():
+                async with session.lock:
+                    await asyncio.to_thread(session.engine.close)
+                self.show_message(f"Changes saved to {session.engine.diff_file}")
+            self.prefetcher.shutdown()
+            self.thumbnailer.shutdown()
+            self.http_client.close()
+            self.resolver.close()
+            self.poster_store.close()
+
+    def on_poster_ready(self, movie):
+        self.thumbnailer.submit(movie.uri, movie.image_path)
+
+    async def get_session(self, name):
+        async with self.sessions_lock:
+            if name not in self.sessions:
+                ratings_file = session_ratings_file(self.ratings_dir, name)
+                if ratings_file is None:
+                    raise HttpError(404, f"No ratings file for session {name}")
+                resume = saved_session_mode(ratings_file) == self.mode
+                engine = await asyncio.to_thread(RankingEngine, self.mode, (), ratings_file, resume,
+                                                 selection=self.selection)
+                await asyncio.to_thread(import_latest_export, ratings_file, None, engine)
+                await asyncio.to_thread(engine.start)
+                self.sessions[name] = WebSession(name, engine)
+                logging.info(f"Opened session {name} ({ratings_file})")
+            return self.sessions[name]
+
+    def movie_json(self, session, movie):
+        return {
+            'uri': movie.uri,
+            'name': movie.name,
+            'year': movie.year,
+            'rating': movie.rating,
+            'poster': f"/posters/{session.name}/{movie.uri.split('/')[-1]}",
+            'poster_ready': self.poster_store.is_fetched(movie.uri),
+        }
+
+    def round_json(self, session):
+        # Called with the session lock held
+        engine = session.engine
+        state = engine.state
+        selected = state.selected_movies or []
+        upcoming = engine.upcoming(POSTER_LOOKAHEAD_ROUNDS)
+        self.prefetcher.prefetch(selected)
+        self.prefetcher.prefetch(upcoming)
+        next_round = engine.next_round_preview() if selected else None
+        return {
+            'session': session.name,
+            'movies': [self.movie_json(session, movie) for movie in selected],
+            'next': [self.movie_json(session, movie) for movie in next_round] if next_round else None,
+            'upcoming': [self.movie_json(session, movie)['poster'] for movie in upcoming],
+            'status': {
+                'bag_cycles': state.bag_cycle_count,
+                'total_ranked': state.total_ranked_count,
+                'movies_in_bag': state.movies_in_bag,
+                'tournament': engine.tournament_progress() if engine.tournament else None,
+                'can_undo': state.previous_movies is not None,
+            },
+        }
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self.send_json(writer, 413, {'error': "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.dispatch(method, target, headers, body, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, body, writer, keep_alive):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            if method == 'GET' and not parts:
+                page = INDEX_HTML.replace('__DEFAULT_SESSION__', self.default_session)
+                await self.send(writer, 200, page.encode('utf-8'), 'text/html; charset=utf-8', keep_alive=keep_alive)
+            elif method == 'GET' and parts == ['api', 'sessions']:
+                names = sorted(entry.name[:-4] for entry in os.scandir(self.ratings_dir)
+                               if entry.name.endswith('.csv') and session_ratings_file(self.ratings_dir, entry.name[:-4]))
+                await self.send_json(writer, 200, {'sessions': names}, keep_alive)
+            elif len(parts) == 3 and parts[0] == 'api':
+                session = await self.get_session(parts[1])
+                status, payload = await self.api(session, method, parts[2], body)
+                await self.send_json(writer, status, payload, keep_alive)
+            elif method == 'GET' and len(parts) == 3 and parts[0] == 'posters':
+                session = await self.get_session(parts[1])
+                height = parse_qs(url.query).get('h', [None])[0]
+                await self.send_poster(writer, session, parts[2], int(height) if height and height.isdigit() else None, headers, keep_alive)
+            else:
+                raise HttpError(404, "Not found")
+        except HttpError as e:
+            await self.send_json(writer, e.status, {'error': str(e)}, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception as e:
+            logging.exception(f"Error handling {method} {target}")
+            await self.send_json(writer, 500, {'error': str(e)}, keep_alive)
+
+    async def api(self, session, method, action, body):
+        engine = session.engine
+        async with session.lock:
+            if method == 'GET' and action == 'round':
+                return 200, self.round_json(session)
+            if method != 'POST':
+                raise HttpError(405, "Method not allowed")
+            if action == 'submit':
+                try:
+                    order = json.loads(body or b'{}').get('order')
+                except (ValueError, AttributeError):
+                    raise HttpError(400, "Expected a JSON body with an 'order' list")
+                selected = engine.state.selected_movies or []
+                uris = [movie.uri for movie in selected]
+                # Rankings name films rather than positions, so a stale page can't rank the wrong round
+                if not isinstance(order, list) or sorted(order) != sorted(uris):
+                    return 409, {'error': "That ranking isn't for the current round", **self.round_json(session)}
+                engine.round_timer.end_round()
+                await asyncio.to_thread(engine.submit, [uris.index(uri) for uri in order])
+                return 200, self.round_json(session)
+            if action == 'undo':
+                if not await asyncio.to_thread(engine.undo):
+                    return 409, {'error': "Cannot Undo!", **self.round_json(session)}
+                return 200, self.round_json(session)
+            if action == 'export':
+                count = await asyncio.to_thread(engine.export_diff)
+                return 200, {'exported': count, 'file': engine.diff_file}
+        raise HttpError(404, "Not found")
+
+    async def send_poster(self, writer, session, uri_id, height, headers, keep_alive):
+        movie = session.engine.movies_by_uri.get(f'https://boxd.it/{uri_id}')
+        if movie is None:
+            raise HttpError(404, "No such film")
+        fetched = self.poster_store.is_fetched(movie.uri)
+        path = (self.poster_store.thumbnail_for(movie, height) if height else None) or self.poster_store.display_path(movie)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            raise HttpError(404, "Poster missing")
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            cache_headers = [
+                f"Cache-Control: {f'public, max-age={POSTER_MAX_AGE}' if fetched else 'no-cache'}",
+                f"ETag: {etag}",
+            ]
+            if headers.get('if-none-match') == etag:
+                await self.send(writer, 304, b'', None, cache_headers, keep_alive)
+                return
+            await self.send(writer, 200, None, 'image/jpeg', cache_headers + [f"Content-Length: {stat.st_size}"], keep_alive)
+            # Straight from the page cache to the socket
+            await asyncio.get_running_loop().sendfile(writer.transport, f, 0, stat.st_size)
+
+    async def send_json(self, writer, status, payload, keep_alive=True):
+        await self.send(writer, status, json.dumps(payload).encode('utf-8'), 'application/json', keep_alive=keep_alive)
+
+    async def send(self, writer, status, body, content_type, extra_headers=(), keep_alive=True):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        lines.extend(extra_headers)
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+        await writer.drain()
+
+INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Snekboxd</title>
+<style>
+  body { font-family: Arial, sans-serif; background: #f0f0f0; margin: 0; padding: 12px; }
+  #movies { display: flex; gap: 12px; flex-wrap: wrap; justify-content: center; }
+  .card { width: 150px; text-align: center; cursor: pointer; position: relative; }
+  .card img { width: 150px; height: 225px; object-fit: cover; background: #ddd; }
+  .card .pick { position: absolute; top: 4px; left: 4px; background: #333; color: #fff; border-radius: 50%;
+                width: 28px; height: 28px; line-height: 28px; font-size: 18px; display: none; }
+  .card.picked .pick { display: block; }
+  .card.picked img { opacity: 0.6; }
+  #controls, #status { text-align: center; margin: 12px; }
+  button { font-size: 16px; margin: 0 6px; }
+</style>
+</head>
+<body>
+<div id="movies"></div>
+<div id="controls">
+  <button id="undo">Undo</button>
+  <button id="reset">Clear</button>
+  <button id="export">Export changes</button>
+</div>
+<div id="status"></div>
+<script>
+const session = new URLSearchParams(location.search).get('session') || '__DEFAULT_SESSION__';
+let round = null, picks = [];
+
+async function api(action, body) {
+  const response = await fetch(`/api/${session}/${action}`, body === undefined ? {} :
+    {method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(body)});
+  const data = await response.json();
+  if (data.error) console.warn(data.error);
+  return data;
+}
+
+function sameRound(a, b) {
+  return JSON.stringify(a.map(m => [m.uri, m.rating])) === JSON.stringify(b.map(m => [m.uri, m.rating]));
+}
+
+function render(data) {
+  if (round && data.movies && sameRound(round.movies, data.movies)) {
+    round = {...data, movies: round.movies};  // Keep picks made while the submission was in flight
+  } else {
+    round = data;
+    picks = [];
+    const container = document.getElementById('movies');
+    container.innerHTML = '';
+    (data.movies || []).forEach((movie, i) => {
+      const card = document.createElement('div');
+      card.className = 'card';
+      card.innerHTML = '<div class="pick"></div><img><div></div><div></div><div></div>';
+      // Titles come from the ratings file, so they're set as text rather than parsed as markup
+      const [img, name, year, rating] = card.querySelectorAll('img, div:not(.pick)');
+      img.src = `${movie.poster}?h=360`;
+      name.textContent = movie.name;
+      year.textContent = `(${movie.year})`;
+      rating.textContent = `Rating: ${movie.rating}`;
+      card.onclick = () => pick(i);
+      container.appendChild(card);
+      if (!movie.poster_ready) retryPoster(card.querySelector('img'), movie.poster);
+    });
+  }
+  const status = data.status || {};
+  document.getElementById('status').textContent = status.tournament ||
+    `Bag Cycles: ${status.bag_cycles}  Total Ranked: ${status.total_ranked}  Movies in Bag: ${status.movies_in_bag}`;
+  // Warm the browser cache with the next rounds' posters while this one is being ranked
+  (data.upcoming || []).forEach(url => { new Image().src = `${url}?h=360`; });
+  showPicks();
+}
+
+function retryPoster(img, url) {
+  setTimeout(() => { if (document.body.contains(img)) img.src = `${url}?h=360&t=${Date.now()}`; }, 3000);
+}
+
+function showPicks() {
+  document.querySelectorAll('.card').forEach((card, i) => {
+    const position = picks.indexOf(i);
+    card.classList.toggle('picked', position >= 0);
+    card.querySelector('.pick').textContent = position + 1;
+  });
+}
+
+function pick(i) {
+  if (picks.includes(i)) picks = picks.filter(p => p !== i); else picks.push(i);
+  showPicks();
+  if (picks.length === round.movies.length) submit();
+}
+
+async function submit() {
+  const order = picks.map(i => round.movies[i].uri);
+  // Show the predicted next round straight away; the reply replaces it if the prediction was off
+  if (round.next) render({...round, movies: round.next, next: null, upcoming: []});
+  render(await api('submit', {order}));
+}
+
+document.addEventListener('keydown', event => {
+  const position = parseInt(event.key, 10);
+  if (position >= 1 && round && position <= round.movies.length) pick(position - 1);
+  if (event.key === 'Backspace') { picks.pop(); showPicks(); }
+});
+document.getElementById('undo').onclick = async () => render(await api('undo', {}));
+document.getElementById('reset').onclick = () => { picks = []; showPicks(); };
+document.getElementById('export').onclick = async () => {
+  const result = await api('export', {});
+  if (result.file) alert(`${result.exported} changed ratings exported to ${result.file}`);
+};
+api('round').then(render);
+</script>
+</body>
+</html>
+"""
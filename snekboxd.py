@@ -1,64 +1,110 @@
-import csv, os, logging, tkinter as tk
-from tkinter import ttk
+import time
+# Cold-start clock; everything below, including the Tk import, counts towards it
+LAUNCH_TIME = time.perf_counter()
+
+import argparse, cProfile, csv, logging, os, random, sys
 from datetime import datetime
-from typing import List, Optional
-from dataclasses import dataclass
+try:
+    import tkinter as tk
+    from tkinter import ttk
+except ImportError:
+    # Only the GUI needs Tk; --terminal and --replay run without it
+    tk = ttk = None
 
 from lib.helper_functions import (
-    install, Movie, get_file_md5, download_poster, get_tmdb_poster_url,
-    shuffle_deque, sanitize_filename,
-    load_csv, save_csv, create_working_copy, create_movie_bag, select_movies,
-    update_ratings, compare_csvs, validated_year_input, validated_rating_input,
+    install_dependencies, Movie, iter_csv, is_valid_uri, is_valid_year, validated_year_input, validated_rating_input,
     validated_uri_input
 )
-
-install('Pillow', 'PIL')
-from PIL import Image, ImageTk
-
-install('screeninfo')
-import screeninfo
+from lib.http_client import HttpClient
+from lib.poster_prefetch import PosterPrefetcher
+from lib.poster_resolver import PosterResolver
+from lib.poster_store import PosterStore, NO_IMAGE_FILE
+from lib.image_cache import PosterImageCache
+from lib.thumbnails import ThumbnailGenerator
+from lib.engine import RankingEngine, Frontend, TranscriptWriter, DEFAULT_RATINGS_FILE, parse_ranking, session_paths
+from lib.letterboxd_export import import_latest_export
+from lib.active_selection import SELECTION_STRATEGIES
+from lib.profiling import timed
+from lib.session import SessionSnapshot
+from lib.terminal_frontend import TerminalFrontend
+
+# Pillow is imported once the first round is on screen; see MovieRankingApp.load_pillow
+Image = None
+ImageTk = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-@dataclass
-class AppState:
-    bag_cycle_count: int = 1
-    total_ranked_count: int = 0
-    movies_in_bag: int = 0
-    selected_movies: List[Movie] = None
-    previous_movies: Optional[List[Movie]] = None
-    fullscreen: bool = False
-
-class MovieRankingApp:
-    def __init__(self, master: tk.Tk, mode, new_movie):
+# How many upcoming rounds of the bag to fetch posters for in the background
+POSTER_LOOKAHEAD_ROUNDS = 3
+
+# Resize events are coalesced until the window has stopped changing for this long
+RESIZE_DEBOUNCE_MS = 150
+
+# Launch to first round drawn, excluding time spent at the terminal prompts
+COLD_START_TARGET_MS = 500
+
+class MovieCard:
+    def __init__(self, parent):
+        self.frame = ttk.Frame(parent)
+        self.poster_label = ttk.Label(self.frame)
+        self.poster_label.pack()
+        self.title_label = ttk.Label(self.frame)
+        self.title_label.pack()
+        self.year_label = ttk.Label(self.frame)
+        self.year_label.pack()
+        self.rating_label = ttk.Label(self.frame)
+        self.rating_label.pack()
+
+    def show(self, movie, photo, img_width, title_font_size, info_font_size):
+        self.poster_label.configure(image=photo or '')
+        self.poster_label.image = photo
+        self.title_label.configure(text=f"{movie.name}", wraplength=img_width, font=('Arial', title_font_size))
+        self.year_label.configure(text=f"({movie.year})", font=('Arial', info_font_size))
+        self.rating_label.configure(text=f"Rating: {movie.rating}", font=('Arial', info_font_size))
+
+    def destroy(self):
+        self.frame.destroy()
+
+class MovieRankingApp(Frontend):
+    def __init__(self, master: 'tk.Tk', engine, prompt_seconds=0.0):
+        super().__init__(engine)
         self.master = master
         self.master.title("Snekboxd")
         
-        self.state = AppState()
+        self.state = engine.state
+        self.round_timer = engine.round_timer
+        self.prompt_seconds = prompt_seconds
         self.setup_window()
         self.setup_styles()
         self.setup_file_paths()
-        self.load_initial_data()
+        self.setup_poster_prefetch()
         self.create_widgets()
         self.setup_bindings()
 
-        self.mode = mode
-        self.new_movie = new_movie
+        self.movie_cards = []
+        self.resize_job = None
+        self.first_round_drawn = False
         
-        self.master.after(100, self.initial_layout)
+        self.master.bind('<Map>', self.on_map, add='+')
 
     def setup_window(self):
         # Get primary monitor information
-        monitor = screeninfo.get_monitors()[0]
+        try:
+            import screeninfo
+            monitor = screeninfo.get_monitors()[0]
+            screen_width, screen_height = monitor.width, monitor.height
+        except ImportError:
+            # Tk's own numbers span every monitor on some platforms, but they're good enough
+            screen_width, screen_height = self.master.winfo_screenwidth(), self.master.winfo_screenheight()
         
         # Set initial window size to 90% of screen size
-        self.window_width = int(monitor.width * 0.9)
-        self.window_height = int(monitor.height * 0.9)
+        self.window_width = int(screen_width * 0.9)
+        self.window_height = int(screen_height * 0.9)
         
         # Calculate x and y coordinates for the Tk root window
-        x = (monitor.width // 2) - (self.window_width // 2)
-        y = (monitor.height // 2) - (self.window_height // 2)
+        x = (screen_width // 2) - (self.window_width // 2)
+        y = (screen_height // 2) - (self.window_height // 2)
         
         # Set the dimensions of the screen and where it is placed
         self.master.geometry(f'{self.window_width}x{self.window_height}+{x}+{y}')
@@ -75,17 +121,16 @@ class MovieRankingApp:
         style.configure('TEntry', font=('Arial', 12))
 
     def setup_file_paths(self):
-        self.original_file = './db/ratings.csv'
-        self.working_file = './db/working_ratings.csv'
-        self.diff_file = './db/changed_ratings.csv'
-        self.no_image_md5 = get_file_md5('./assets/no_image.jpg')
-
-    def load_initial_data(self):
-        create_working_copy(self.original_file, self.working_file)
-        self.movies = load_csv(self.working_file)
-        self.bag = create_movie_bag(self.movies)
-        self.state.movies_in_bag = len(self.bag)
-        self.movie_frames = []
+        self.poster_store = PosterStore()
+        self.image_cache = PosterImageCache()
+
+    def setup_poster_prefetch(self):
+        self.http_client = HttpClient(pool_size=4)
+        self.resolver = PosterResolver(self.http_client)
+        self.prefetcher = PosterPrefetcher(
+            self.master, self.poster_store, self.resolver, self.on_poster_ready, round_timer=self.round_timer
+        )
+        self.thumbnailer = ThumbnailGenerator(self.poster_store)
 
     def create_widgets(self):
         self.main_frame = ttk.Frame(self.master)
@@ -128,14 +173,22 @@ class MovieRankingApp:
         self.undo_button.pack(side=tk.LEFT)
 
     def create_counter_labels(self):
-        self.bag_cycle_label = ttk.Label(self.counter_frame, text="Bag Cycles: 1", font=('Arial', 14))
+        self.bag_cycle_label = ttk.Label(self.counter_frame, text=f"Bag Cycles: {self.state.bag_cycle_count}", font=('Arial', 14))
         self.bag_cycle_label.pack(side=tk.LEFT, padx=(0, 20))
 
-        self.total_ranked_label = ttk.Label(self.counter_frame, text="Total Ranked: 0", font=('Arial', 14))
+        self.total_ranked_label = ttk.Label(self.counter_frame, text=f"Total Ranked: {self.state.total_ranked_count}", font=('Arial', 14))
         self.total_ranked_label.pack(side=tk.LEFT, padx=(0, 20))
 
         self.movies_in_bag_label = ttk.Label(self.counter_frame, text=f"Movies in Bag: {self.state.movies_in_bag}", font=('Arial', 14))
-        self.movies_in_bag_label.pack(side=tk.LEFT)
+        self.movies_in_bag_label.pack(side=tk.LEFT, padx=(0, 20))
+
+        # Rounds skipped because earlier answers already settled their order
+        self.rounds_skipped_label = ttk.Label(self.counter_frame, text=f"Already Known: {self.state.rounds_skipped}", font=('Arial', 14))
+        self.rounds_skipped_label.pack(side=tk.LEFT)
+
+        self.tournament_label = ttk.Label(self.counter_frame, font=('Arial', 14))
+        if self.engine.progress() is not None:
+            self.tournament_label.pack(side=tk.LEFT, padx=(20, 0))
 
     def create_input_widgets(self):
         self.ranking_entry = ttk.Entry(self.input_frame, font=('Arial', 24), width=10)
@@ -154,9 +207,17 @@ class MovieRankingApp:
         self.master.bind('<Return>', lambda event: self.submit_ranking())
         self.master.bind('<Tab>', lambda event: self.submit_ranking())
         self.master.bind('<Escape>', lambda event: self.quit_app())
+        self.master.bind('<Control-s>', lambda event: self.export_diff())
+        self.master.bind('<Control-r>', lambda event: self.merge_export())
         self.master.bind("<Configure>", self.on_resize)
         self.master.protocol("WM_DELETE_WINDOW", self.quit_app)
 
+    def on_map(self, event):
+        # Lay out the first round as soon as the window is on screen and has its real size
+        if event.widget == self.master and not self.first_round_drawn:
+            self.first_round_drawn = True
+            self.initial_layout()
+
     def initial_layout(self):
         self.window_width = self.master.winfo_width()
         self.window_height = self.master.winfo_height()
@@ -164,26 +225,63 @@ class MovieRankingApp:
         movies_frame_height = int(self.window_height * 0.85)
         self.movies_frame.configure(width=self.window_width - 40, height=movies_frame_height)
         
-        self.load_new_movies()
+        self.engine.start()
+        self.show_round()
+        self.master.update_idletasks()
+        self.report_cold_start()
+
+        # Posters fill in once Pillow has loaded, straight after the first frame is drawn
+        self.master.after_idle(self.load_pillow)
+        # Then the rest of the library's thumbnails, rendered in other processes
+        self.master.after_idle(self.thumbnailer.submit_missing)
+        self.master.after_idle(lambda: self.engine.save_session(full=True))
+
+    def report_cold_start(self):
+        cold_start_ms = (time.perf_counter() - LAUNCH_TIME - self.prompt_seconds) * 1000
+        message = f"First round drawn {cold_start_ms:.0f} ms after launch (target {COLD_START_TARGET_MS} ms)"
+        if cold_start_ms > COLD_START_TARGET_MS:
+            logging.warning(message)
+        else:
+            logging.info(message)
+
+    def load_pillow(self):
+        global Image, ImageTk
+        try:
+            from PIL import Image, ImageTk
+        except ImportError:
+            logging.error("Pillow is not installed, so posters can't be shown. Run `python snekboxd.py --setup`.")
+            return
+        self.update_layout()
 
     def on_resize(self, event):
         if event.widget == self.master and not self.state.fullscreen:
-            # Get the actual window size
-            self.window_width = self.master.winfo_width()
-            self.window_height = self.master.winfo_height()
-            
-            # Update layout
-            self.update_layout()
+            # A drag fires <Configure> for every pixel, so only relayout once it settles
+            if self.resize_job is not None:
+                self.master.after_cancel(self.resize_job)
+            self.resize_job = self.master.after(RESIZE_DEBOUNCE_MS, self.on_resize_settled)
+
+    def on_resize_settled(self):
+        self.resize_job = None
+
+        # Get the actual window size
+        window_width = self.master.winfo_width()
+        window_height = self.master.winfo_height()
+        if (window_width, window_height) == (self.window_width, self.window_height):
+            return  # Moved, not resized
+        self.window_width = window_width
+        self.window_height = window_height
+
+        # Update layout
+        self.update_layout()
 
+    @timed('update_layout')
     def update_layout(self):
         if not self.state.selected_movies:
             return
 
-        for frame in self.movie_frames:
-            frame.destroy()
-        self.movie_frames = []
-
         num_movies = len(self.state.selected_movies)
+        with self.round_timer.stage('update_layout.widgets'):
+            self.ensure_movie_cards(num_movies)
 
         movies_frame_width = self.movies_frame.winfo_width()
         movies_frame_height = self.movies_frame.winfo_height()
@@ -198,135 +296,135 @@ class MovieRankingApp:
             img_height = max_img_height
             img_width = int(img_height / 1.5)
 
-        for i, movie in enumerate(self.state.selected_movies):
-            frame = ttk.Frame(self.movies_frame)
-            frame.pack(side=tk.LEFT, anchor=tk.N, padx=(0, 20) if i < num_movies - 1 else 0)
-
-            if movie.image_path:
-                img = Image.open(movie.image_path)
-                img = img.resize((img_width, img_height), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                label = ttk.Label(frame, image=photo)
-                label.image = photo
-                label.pack()
-
-            title_font_size = max(8, min(12, int(img_width / 10)))
-            info_font_size = max(6, min(10, int(img_width / 12)))
-
-            ttk.Label(frame, text=f"{movie.name}", wraplength=img_width, font=('Arial', title_font_size)).pack()
-            ttk.Label(frame, text=f"({movie.year})", font=('Arial', info_font_size)).pack()
-            ttk.Label(frame, text=f"Rating: {movie.rating}", font=('Arial', info_font_size)).pack()
+        title_font_size = max(8, min(12, int(img_width / 10)))
+        info_font_size = max(6, min(10, int(img_width / 12)))
 
-            self.movie_frames.append(frame)
+        for card, movie in zip(self.movie_cards, self.state.selected_movies):
+            photo = self.get_poster_photo(movie, img_width, img_height)
+            with self.round_timer.stage('update_layout.widgets'):
+                card.show(movie, photo, img_width, title_font_size, info_font_size)
 
-    def load_new_movies(self):
-        for frame in self.movie_frames:
-            frame.destroy()
-        self.movie_frames = []
-
-        if len(self.bag) < 2:
-            if len(self.bag) > 0:
-                self.bag.popleft()
-            self.bag.extend(self.movies)
-            shuffle_deque(self.bag)
-            self.state.bag_cycle_count += 1
-            self.bag_cycle_label.config(text=f"Bag Cycles: {self.state.bag_cycle_count}")
-
-        num_movies = min(5, len(self.bag))
-        self.state.selected_movies = select_movies(self.bag, num_movies)
+    def ensure_movie_cards(self, num_movies):
+        # Cards are reused across rounds; the pool only changes when the round size does
+        if len(self.movie_cards) == num_movies:
+            return
+        while len(self.movie_cards) < num_movies:
+            self.movie_cards.append(MovieCard(self.movies_frame))
+        while len(self.movie_cards) > num_movies:
+            self.movie_cards.pop().destroy()
+        for i, card in enumerate(self.movie_cards):
+            card.frame.pack(side=tk.LEFT, anchor=tk.N, padx=(0, 20) if i < num_movies - 1 else 0)
+
+    def get_poster_photo(self, movie, width, height):
+        if Image is None:
+            return None
+        photo = self.image_cache.get(self.poster_store.display_path(movie), width, height)
+        if photo is None:
+            with self.round_timer.stage('update_layout.decode_resize'):
+                img = self.open_poster(movie, width, height)
+                if img.size != (width, height):
+                    img = img.resize((width, height), Image.LANCZOS)
+                photo = ImageTk.PhotoImage(img)
+            self.image_cache.put(self.poster_store.display_path(movie), width, height, photo)
+        return photo
 
-        if self.mode == "2" and self.new_movie not in self.state.selected_movies:
-            self.state.selected_movies.append(self.new_movie)
+    def open_poster(self, movie, width, height):
+        # A pre-rendered thumbnail only needs a small downscale; otherwise have the JPEG
+        # decoder skip detail the slot can't show
+        try:
+            thumbnail = self.poster_store.thumbnail_for(movie, height)
+            if thumbnail is not None:
+                return Image.open(thumbnail)
+            img = Image.open(self.poster_store.display_path(movie))
+            img.draft('RGB', (width, height))
+            return img
+        except OSError:
+            # Poster was deleted or corrupted outside the app; forget it so it gets fetched again
+            logging.error(f"Could not open poster for {movie.name}")
+            self.poster_store.mark_missing(movie.uri, movie.image_path)
+            # Other sizes decoded from it earlier would otherwise outlive the refetched file
+            self.image_cache.invalidate(movie.image_path)
+            return Image.open(NO_IMAGE_FILE)
+
+    @timed('show_round')
+    def show_round(self):
+        progress = self.engine.progress()
+        if progress is not None:
+            self.tournament_label.config(text=progress)
+        if not self.state.selected_movies:
+            self.ensure_movie_cards(0)
+            return
 
         self.fetch_missing_posters()
 
-        self.state.movies_in_bag = len(self.bag)
+        self.bag_cycle_label.config(text=f"Bag Cycles: {self.state.bag_cycle_count}")
+        self.total_ranked_label.config(text=f"Total Ranked: {self.state.total_ranked_count}")
         self.movies_in_bag_label.config(text=f"Movies in Bag: {self.state.movies_in_bag}")
-        
-        self.state.selected_movies.sort(key=lambda movie: movie.rating)
+        self.rounds_skipped_label.config(text=f"Already Known: {self.state.rounds_skipped}")
 
         self.update_layout()
 
         self.ranking_entry.delete(0, tk.END)
         self.ranking_entry.focus_set()
 
+    def show_message(self, message):
+        print(message)
+
+    def run(self):
+        self.master.mainloop()
+
+    @timed('show_round.fetch_missing_posters')
     def fetch_missing_posters(self):
-        for movie in self.state.selected_movies:
-            if os.path.exists(movie.image_path):
-                if get_file_md5(movie.image_path) == self.no_image_md5:
-                    logging.info(f"Fetching poster for {movie.name}")
-                    poster_url = get_tmdb_poster_url(movie.uri)
-                    if poster_url:
-                        if download_poster(poster_url, movie.image_path):
-                            logging.info(f"Successfully downloaded poster for {movie.name}")
-                        else:
-                            logging.error(f"Failed to download poster for {movie.name}")
-                    else:
-                        logging.error(f"Poster not found for {movie.name}")
+        # Current round first, then the next few rounds, drawn ahead of time
+        self.prefetcher.prefetch(self.state.selected_movies)
+        self.prefetcher.prefetch(self.engine.upcoming(POSTER_LOOKAHEAD_ROUNDS))
 
+    def on_poster_ready(self, movie):
+        self.thumbnailer.submit(movie.uri, movie.image_path)
+        if self.state.selected_movies and movie in self.state.selected_movies:
+            self.update_layout()
+
+    @timed('submit_ranking')
     def submit_ranking(self):
-        ranking = self.ranking_entry.get()
-        num_movies = len(self.state.selected_movies)
-        if len(ranking) == 0:
-            ranking = "654321"[6-num_movies:6]
-        if len(ranking) == num_movies and ranking.isdigit() and set(ranking) == set(map(str, range(1, num_movies + 1))):
-            ranking = [int(r) - 1 for r in ranking]
-            update_ratings(self.state.selected_movies, ranking)
-            save_csv(self.working_file, self.movies)
-            self.state.total_ranked_count += num_movies
-            self.total_ranked_label.config(text=f"Total Ranked: {self.state.total_ranked_count}")
-            self.state.previous_movies = self.state.selected_movies
-            self.load_new_movies()
+        # A round's record runs from one submission to the next
+        self.round_timer.end_round()
+
+        ranking = parse_ranking(self.ranking_entry.get(), len(self.state.selected_movies))
+        if ranking is not None:
+            self.engine.submit(ranking)
+            self.show_round()
         else:
             self.ranking_entry.delete(0, tk.END)
         
         self.ranking_entry.focus_set()
 
-    def undo_last(self):
-        if self.state.previous_movies is None:
-            print("Cannot Undo!")
-        else:
-            for movie in self.state.selected_movies:
-                if movie != self.new_movie:
-                    self.bag.append(movie)
-                    self.state.total_ranked_count -= 1
-            self.state.selected_movies = self.state.previous_movies
-            self.state.previous_movies = None
-            
-            self.total_ranked_label.config(text=f"Total Ranked: {self.state.total_ranked_count}")
-
-            self.state.movies_in_bag = len(self.bag)
-            self.movies_in_bag_label.config(text=f"Movies in Bag: {self.state.movies_in_bag}")
-            
-            self.state.selected_movies.sort(key=lambda movie: movie.rating)
+    def export_diff(self):
+        count = self.engine.export_diff()
+        self.show_message(f"{count} changed ratings exported to {self.engine.diff_file}")
 
-            self.update_layout()
+    def merge_export(self):
+        merge = import_latest_export(self.engine.original_file, engine=self.engine)
+        if merge is None:
+            self.show_message("No new Letterboxd export to merge")
+            return
+        self.show_message(f"Letterboxd export merged: {merge.summary()}")
+        self.show_round()
 
-            self.ranking_entry.delete(0, tk.END)
-            self.ranking_entry.focus_set()
+    def undo_last(self):
+        if not self.engine.undo():
+            self.show_message("Cannot Undo!")
+        else:
+            self.show_round()
 
     def quit_app(self):
-        compare_csvs(self.original_file, self.working_file, self.diff_file)
-        print(f"Changes saved to {self.diff_file}")
-
-        if self.new_movie:
-            new_movie = self.new_movie
-            with open(self.working_file, 'a', newline='', encoding='utf-8') as working_file:
-                writer = csv.writer(working_file)
-                writer.writerow([new_movie.date, new_movie.name, new_movie.year, new_movie.uri, new_movie.rating])
-            
-            with open(self.diff_file, 'a', newline='', encoding='utf-8') as diff_file:
-                writer = csv.writer(diff_file)
-                writer.writerow([new_movie.date, new_movie.name, new_movie.year, new_movie.uri, new_movie.rating])
-
-        create_working_copy(self.working_file, self.original_file)
-
-        try:
-            os.remove(self.working_file)
-            print(f"Successfully deleted {self.working_file}")
-        except OSError as e:
-            print(f"Error deleting {self.working_file}: {e}")
-
+        self.engine.close()
+        self.show_message(f"Changes saved to {self.engine.diff_file}")
+
+        self.prefetcher.shutdown()
+        self.thumbnailer.shutdown()
+        self.http_client.close()
+        self.resolver.close()
+        self.poster_store.close()
         self.master.quit()
 
 def get_new_movie_info():
@@ -349,24 +447,199 @@ def get_new_movie_info():
         rating=rating
     )
 
+def get_new_movies_info():
+    # A festival weekend's worth of films is placed in one session
+    new_movies = [get_new_movie_info()]
+    while True:
+        print(f"{len(new_movies)} film{'s' if len(new_movies) > 1 else ''} to place. Add another newly watched film? Y/N")
+        if input().lower() not in ["yes", "1", "true", "y"]:
+            return new_movies
+        print("")
+        new_movies.append(get_new_movie_info())
+
+def read_new_films(filename):
+    # Letterboxd's ratings.csv layout, header row included; exits on anything that can't be placed
+    try:
+        with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
+            rows = list(csv.reader(csvfile))[1:]
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        sys.exit(f"Can't read {filename}: {e}")
+    if not rows:
+        sys.exit(f"{filename} has no films in it")
+    new_movies = []
+    for line, row in enumerate(rows, start=2):
+        if len(row) != 5:
+            sys.exit(f"{filename}, line {line}: expected Date,Name,Year,Letterboxd URI,Rating but got {len(row)} columns")
+        date, name, year, uri, rating = row
+        try:
+            rating = float(rating)
+        except ValueError:
+            sys.exit(f"{filename}, line {line}: {name or uri} has no rating; give it a first guess between 0.5 and 5")
+        if not name or not 0.5 <= rating <= 5.0:
+            sys.exit(f"{filename}, line {line}: each film needs a name and a rating between 0.5 and 5")
+        if not is_valid_uri(uri):
+            sys.exit(f"{filename}, line {line}: {uri!r} isn't a shortened Letterboxd URL like 'https://boxd.it/29MQ'")
+        if not (year.isdigit() and is_valid_year(int(year))):
+            sys.exit(f"{filename}, line {line}: {year!r} isn't a release year for {name}")
+        new_movies.append(Movie(date, name, year, uri, round(rating * 2) / 2))
+    return new_movies
+
+def drop_known_films(new_movies, ratings_file):
+    # A film listed twice or already in the library would be ranked against itself
+    rated = {movie.uri for movie in iter_csv(ratings_file)} if os.path.exists(ratings_file) else set()
+    kept = {}
+    for movie in new_movies:
+        if movie.uri in rated:
+            print(f"Skipping {movie.name} ({movie.year}): {movie.uri} is already in {ratings_file}")
+        elif movie.uri in kept:
+            print(f"Skipping {movie.name} ({movie.year}): {movie.uri} is listed twice")
+        else:
+            kept[movie.uri] = movie
+    if not kept:
+        sys.exit("No new films left to place")
+    return list(kept.values())
+
 def get_operation_mode() -> str:
     while True:
         print("Choose operation mode:")
         print("1.) Re-evaluate Existing Ratings")
         print("2.) Rank Newly Watched Film Against Others")
+        print("3.) Sort the Whole Library (resumable tournament)")
         mode = input()
-        if mode in ["1", "2"]:
+        if mode in ["1", "2", "3"]:
             return mode
-        print("Invalid input. Please enter 1 or 2.")
+        print("Invalid input. Please enter 1, 2 or 3.")
+
+def get_resume_mode(requested_mode, ratings_file):
+    session = SessionSnapshot(session_paths(ratings_file)['session'])
+    records = session.read_records() if session.exists() else []
+    if not records or requested_mode not in (None, records[0]['mode']):
+        return None
+    base, latest = records[0], records[-1]
+    rows = base.get('new_movies') or ([base['new_movie']] if base.get('new_movie') else [])
+    placing = f", placing {', '.join(row[1] for row in rows)}" if rows else ""
+    print(f"Resume the last session (mode {base['mode']}, {latest['total_ranked_count']} ranked{placing})? Y/N")
+    if input().lower() in ["", "yes", "1", "true", "y"]:
+        return base['mode']
+    session.remove()
+    return None
+
+def merge_export(engine, export_file=None):
+    merge = import_latest_export(engine.original_file, export_file, engine)
+    if merge:
+        print(f"Letterboxd export merged: {merge.summary()} (see {session_paths(engine.original_file)['merge_report']})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rank your Letterboxd films against each other.")
+    parser.add_argument('--setup', action='store_true', help="Install missing third-party packages and exit")
+    parser.add_argument('--mode', choices=["1", "2", "3"], help="Operation mode; asked interactively if omitted")
+    parser.add_argument('--timings', metavar='FILE', help="On quit, print per-stage round latencies (p50/p95/max) and save them as JSON")
+    parser.add_argument('--profile', metavar='FILE', help="Record a cProfile of the whole session to FILE")
+    parser.add_argument('--ratings', metavar='FILE', default=DEFAULT_RATINGS_FILE, help="Ratings file to rank; the session's other files are kept next to it")
+    parser.add_argument('--new-films', metavar='CSV',
+                        help="Mode 2: place every film in CSV (Letterboxd's Date,Name,Year,Letterboxd URI,Rating columns; the rating is your first guess) instead of typing them in")
+    parser.add_argument('--selection', choices=SELECTION_STRATEGIES, default='active',
+                        help="How rounds are drawn: 'active' picks films from neighbouring ratings whose order is least certain, 'random' spreads each round across ratings")
+    parser.add_argument('--terminal', action='store_true', help="Rank in the terminal instead of the GUI")
+    parser.add_argument('--record', metavar='FILE', help="Save a transcript of every round to FILE")
+    parser.add_argument('--replay', metavar='FILE', help="Run a recorded transcript through the ranking engine and report how it went")
+    parser.add_argument('--export', metavar='ZIP', help="Letterboxd export to import from; defaults to the newest letterboxd-*.zip next to the ratings file")
+    parser.add_argument('--serve', metavar='PORT', type=int, help="Serve rounds to a web browser on PORT instead of opening the GUI")
+    parser.add_argument('--solve', action='store_true', help="Refit every rating to all the rankings made so far (needs numpy) and exit")
+    parser.add_argument('--host', default='127.0.0.1', help="Address for --serve to listen on; 0.0.0.0 makes it reachable from the LAN")
+    args = parser.parse_args()
+    if args.new_films:
+        if args.mode not in (None, "2"):
+            parser.error("--new-films places films with mode 2")
+        args.mode = "2"
+    if args.serve and args.mode == "2":
+        parser.error("--serve supports modes 1 and 3")
+    return args
+
+def replay(transcript_file):
+    from lib.replay import replay_transcript
+    result, round_timer = replay_transcript(transcript_file)
+    print(f"Replayed {result['rounds']} rounds and {result['undos']} undos in {result['seconds']:.3f} s ({result['rounds_per_s']:.0f} rounds/s)")
+    if result['diverged']:
+        print(f"{result['diverged']} rounds were drawn differently from the recording and were replaced with the recorded ones")
+    print(round_timer.format_summary())
+    print(f"Final ratings {'match' if result['matches'] else 'DO NOT match'} the recording ({result['final']})")
+    return result['matches']
+
+def solve(ratings_file):
+    from lib.bradley_terry import solve_ratings
+    changed = solve_ratings(ratings_file)
+    if changed is None:
+        return False
+    if changed:
+        print(f"{changed} ratings changed; the changes are in {session_paths(ratings_file)['diff']}")
+    else:
+        print("The rankings so far already agree with your ratings")
+    return True
 
 def main():
-    mode = get_operation_mode()
-    new_movie = get_new_movie_info() if mode == "2" else None
-
-    root = tk.Tk()
-    app = MovieRankingApp(root, mode, new_movie)
-    
-    root.mainloop()
+    args = parse_args()
+    if args.setup:
+        install_dependencies()
+        print("All dependencies are installed.")
+        return
+
+    if args.replay:
+        sys.exit(0 if replay(args.replay) else 1)
+    import_latest_export(args.ratings, args.export)
+    if args.solve:
+        sys.exit(0 if solve(args.ratings) else 1)
+    if args.serve:
+        from lib.web_frontend import WebFrontend
+        WebFrontend(args.ratings, args.mode or "1", args.host, args.serve, args.selection).run()
+        return
+
+    # Time spent waiting on the user isn't part of the cold start
+    prompt_start = time.perf_counter()
+    # Films passed with --new-films start a new placement rather than resuming the last one
+    mode = None if args.new_films else get_resume_mode(args.mode, args.ratings)
+    resume = mode is not None
+    if not resume:
+        mode = args.mode or get_operation_mode()
+    # A resumed mode 2 session brings its new films back from the snapshot
+    new_movies = []
+    if mode == "2" and not resume:
+        new_movies = drop_known_films(read_new_films(args.new_films) if args.new_films else get_new_movies_info(), args.ratings)
+    prompt_seconds = time.perf_counter() - prompt_start
+
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    seed = transcript = None
+    if args.record:
+        # Seeded, so a replay draws the same rounds
+        seed = random.randrange(2 ** 32)
+        transcript = TranscriptWriter(args.record)
+    engine = RankingEngine(mode, new_movies, args.ratings, resume, seed=seed, transcript=transcript, selection=args.selection)
+    if args.record:
+        # A merge would change the library after the transcript's header; it waits for the next launch
+        logging.info("Not merging a new Letterboxd export while recording")
+    else:
+        merge_export(engine, args.export)
+
+    if args.terminal:
+        frontend = TerminalFrontend(engine)
+    else:
+        frontend = MovieRankingApp(tk.Tk(), engine, prompt_seconds=prompt_seconds)
+    frontend.run()
+
+    if args.timings:
+        engine.round_timer.end_round()
+        print(engine.round_timer.format_summary())
+        engine.round_timer.dump(args.timings)
+        print(f"Round timings saved to {args.timings}")
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"Profile saved to {args.profile} (view with: python -m pstats {args.profile})")
 
 if __name__ == "__main__":
     main()